@@ -4,7 +4,6 @@ Custom integration to integrate Dahua cameras with Home Assistant.
 import asyncio
 from typing import Any, Dict
 import logging
-import ssl
 import time
 
 from datetime import timedelta
@@ -20,8 +19,9 @@ from homeassistant.helpers.update_coordinator import DataUpdateCoordinator, Upda
 from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers.typing import ConfigType
 from homeassistant.const import EVENT_HOMEASSISTANT_STOP
+from homeassistant.util.ssl import SSLCipherList, create_no_verify_ssl_context
 
-from custom_components.dahua.thread import DahuaEventThread, DahuaVtoEventThread
+from custom_components.dahua.thread import DahuaEventTask, DahuaVtoEventTask
 from . import dahua_utils
 from .client import DahuaClient
 
@@ -43,10 +43,16 @@ from .vto import DahuaVTOClient
 
 SCAN_INTERVAL_SECONDS = timedelta(seconds=30)
 
-SSL_CONTEXT = ssl.create_default_context()
-SSL_CONTEXT.set_ciphers("DEFAULT")
-SSL_CONTEXT.check_hostname = False
-SSL_CONTEXT.verify_mode = ssl.CERT_NONE
+# Keep idle connections to the device open for longer than the scan interval so each refresh reuses them instead of
+# doing a new TCP (and TLS for HTTPS cams) handshake per request. Cams don't handle many parallel connections well
+# so cap the pool too. Every coordinator gets its own session so these limits are per device/channel.
+KEEPALIVE_TIMEOUT_SECONDS = SCAN_INTERVAL_SECONDS.total_seconds() + 15
+MAX_CONNECTIONS = 8
+MAX_CONNECTIONS_PER_HOST = 4
+
+# Self signed certs are used over HTTPS so we don't verify them, and older devices need the wider cipher list. Built once
+# and shared by every coordinator. create_no_verify_ssl_context is what Home Assistant 2024.1 (our minimum) has
+SSL_CONTEXT = create_no_verify_ssl_context(SSLCipherList.INSECURE)
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -77,10 +83,16 @@ async def async_setup_entry(hass: HomeAssistant, entry: ConfigEntry):
 
     coordinator = DahuaDataUpdateCoordinator(hass, events=events, address=address, port=port, rtsp_port=rtsp_port,
                                              username=username, password=password, name=name, channel=channel)
-    await coordinator.async_config_entry_first_refresh()
+    try:
+        await coordinator.async_config_entry_first_refresh()
+    except Exception:
+        # Setup will be retried with a new coordinator so don't leave this one's sessions open
+        await coordinator.async_stop(None)
+        raise
 
     if not coordinator.last_update_success:
         _LOGGER.warning("dahua async_setup_entry for init, data not ready")
+        await coordinator.async_stop(None)
         raise ConfigEntryNotReady
 
     hass.data[DOMAIN][entry.entry_id] = coordinator
@@ -107,11 +119,17 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
                  password: str, name: str, channel: int) -> None:
         """Initialize the coordinator."""
         # Self signed certs are used over HTTPS so we'll disable SSL verification
-        connector = TCPConnector(enable_cleanup_closed=True, ssl=SSL_CONTEXT)
+        connector = TCPConnector(enable_cleanup_closed=True, ssl=SSL_CONTEXT, limit=MAX_CONNECTIONS,
+                                 limit_per_host=MAX_CONNECTIONS_PER_HOST, keepalive_timeout=KEEPALIVE_TIMEOUT_SECONDS)
         self._session = ClientSession(connector=connector)
 
+        # The event stream is a single long lived request so it gets its own connection outside of the pool above
+        event_connector = TCPConnector(enable_cleanup_closed=True, ssl=SSL_CONTEXT, limit=1)
+        self._event_session = ClientSession(connector=event_connector)
+
         # The client used to communicate with Dahua devices
-        self.client: DahuaClient = DahuaClient(username, password, address, port, rtsp_port, self._session)
+        self.client: DahuaClient = DahuaClient(username, password, address, port, rtsp_port, self._session,
+                                               self._event_session)
 
         self.platforms = []
         self.initialized = False
@@ -123,6 +141,7 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         self._supports_event_notifications = False
         self._supports_smart_motion_detection = False
         self._supports_lighting = False
+        self._supports_infrared_light = False
         self._supports_floodlightmode = False
         self._serial_number: str
         self._profile_mode = "0"
@@ -130,6 +149,8 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         self._channel = channel
         self._address = address
         self._max_streams = 3  # 1 main stream + 2 sub-streams by default
+        # The stream indexes the device can actually serve. None until we've checked the encode config
+        self._available_streams: list[int] | None = None
 
         self._supports_lighting_v2 = False
 
@@ -145,12 +166,12 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         # This is the name as reported from the camera itself
         self.machine_name = ""
 
-        # This thread is what connects to the cameras event stream and fires on_receive when there's an event
-        self.dahua_event_thread = DahuaEventThread(hass, self.client, self.on_receive, events, self._channel)
+        # This task is what connects to the cameras event stream and fires on_receive when there's an event
+        self.dahua_event_task = DahuaEventTask(hass, self.client, self.on_receive, events, self._channel)
 
-        # This thread will connect to VTO devices (Dahua doorbells)
-        self.dahua_vto_event_thread = DahuaVtoEventThread(hass, self.client, self.on_receive_vto_event, host=address,
-                                                          port=5000, username=username, password=password)
+        # This task will connect to VTO devices (Dahua doorbells)
+        self.dahua_vto_event_task = DahuaVtoEventTask(hass, self.client, self.on_receive_vto_event, host=address,
+                                                      port=5000, username=username, password=password)
 
         # A dictionary of event name (CrossLineDetection, VideoMotion, etc) to a listener for that event
         # The key will be formed from self.get_event_key(event_name) and includes the channel
@@ -162,22 +183,24 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
 
         self._floodlight_mode = 2
 
-        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL_SECONDS)
+        # Every poll builds a new data dict, and most of the time it's the same as the last one. always_update=False has
+        # the coordinator compare them and skip updating all the entities when nothing changed
+        super().__init__(hass, _LOGGER, name=DOMAIN, update_interval=SCAN_INTERVAL_SECONDS, always_update=False)
 
     async def async_start_event_listener(self):
         """ Starts the event listeners for IP cameras (this does not work for doorbells (VTO)) """
         if self.events is not None:
-            self.dahua_event_thread.start()
+            self.dahua_event_task.start()
 
     async def async_start_vto_event_listener(self):
         """ Starts the event listeners for doorbells (VTO). This will not work for IP cameras"""
-        if self.dahua_vto_event_thread is not None:
-            self.dahua_vto_event_thread.start()
+        if self.dahua_vto_event_task is not None:
+            self.dahua_vto_event_task.start()
 
     async def async_stop(self, event: Any):
         """ Stop anything we need to stop """
-        self.dahua_event_thread.stop()
-        self.dahua_vto_event_thread.stop()
+        self.dahua_event_task.stop()
+        self.dahua_vto_event_task.stop()
         await self._close_session()
 
     async def _close_session(self) -> None:
@@ -188,6 +211,36 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
                 self._session = None
             except Exception as e:
                 _LOGGER.exception("serverConnect - failed to close session")
+        if self._event_session is not None:
+            try:
+                await self._event_session.close()
+                self._event_session = None
+            except Exception:
+                _LOGGER.exception("serverConnect - failed to close event session")
+
+    @staticmethod
+    async def _async_supports(semaphore: asyncio.Semaphore, probe, errors=ClientError) -> bool:
+        """
+        Awaits a probe request. Returns true if it worked, or false if the device rejected it. A timeout doesn't tell us
+        the feature is missing (the device could just be slow or busy) so that fails the setup and it's tried again
+        later, instead of hiding the entities for good
+        """
+        async with semaphore:
+            try:
+                await probe
+                return True
+            except asyncio.TimeoutError as exception:
+                # Checked first since aiohttp's ServerTimeoutError is also a ClientError
+                raise ConfigEntryNotReady("Timed out probing the features of the Dahua device") from exception
+            except errors:
+                return False
+
+    async def _async_get_encode_config(self) -> dict | None:
+        """ Returns the encode config, or None if we couldn't get it """
+        try:
+            return await self.client.async_get_config("Encode")
+        except ClientError:
+            return None
 
     async def _async_update_data(self):
         """Reload the camera information"""
@@ -196,16 +249,28 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         # Do the one time initialization (do this when Home Assistant starts)
         if not self.initialized:
             try:
+                # None of these depend on each other so fetch them all at once
+                max_extra_streams, encode, identity = await asyncio.gather(
+                    self.client.get_max_extra_streams(),
+                    self._async_get_encode_config(),
+                    self.client.async_get_device_identity(),
+                )
+
                 # Find the max number of streams. 1 main stream + n number of sub-streams
-                self._max_streams = await self.client.get_max_extra_streams() + 1
+                self._max_streams = max_extra_streams + 1
                 _LOGGER.info("Using max streams %s", self._max_streams)
 
-                machine_name = await self.client.async_get_machine_name()
-                sys_info = await self.client.async_get_system_info()
-                version = await self.client.get_software_version()
-                data.update(machine_name)
-                data.update(sys_info)
-                data.update(version)
+                # Some devices (mostly NVRs) advertise more sub-streams than they have enabled. Check the encode
+                # config once so we don't create camera entities for streams that can't be served
+                if encode is not None:
+                    self._available_streams = [0] + [
+                        i + 1 for i in range(self._max_streams - 1)
+                        if encode.get("table.Encode[{0}].ExtraFormat[{1}].VideoEnable".format(self._channel, i),
+                                      "true") != "false"
+                    ]
+                _LOGGER.info("Using available streams %s", self.get_available_streams())
+
+                data.update(identity)
 
                 device_type = data.get("deviceType", None)
                 # Lorex NVRs return deviceType=31, but the model is in the updateSerial
@@ -226,44 +291,40 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
                 self.machine_name = data.get("table.General.MachineName")
                 self._serial_number = data.get("serialNumber")
 
-                try:
-                    await self.client.async_get_snapshot(0)
-                    # If able to take a snapshot with index 0 then most likely this cams channel needs to be reset
-                    # but check if unit is not a doorbell first as channel 0 doesnt exist for VTOs
-                    if not self.is_doorbell():
-                        self._channel_number = self._channel
-                except ClientError:
-                    pass
+                # Probe for the features the device supports. Each probe is independent so run them together, but
+                # no more at a time than the connections we allow per host so none of them sit queued in the pool
+                # long enough to time out. Cams don't handle many parallel requests well.
+                # Smart motion detection is enabled/disabled/fetched differently on Dahua devices compared to Amcrest,
+                # the smart motion probe here is for Dahua devices
+                probes = asyncio.Semaphore(MAX_CONNECTIONS_PER_HOST)
+                (
+                    snapshot_at_index_0,
+                    self._supports_coaxial_control,
+                    self._supports_disarming_linkage,
+                    self._supports_event_notifications,
+                    self._supports_smart_motion_detection,
+                    self._supports_lighting,
+                    self._supports_lighting_v2,
+                ) = await asyncio.gather(
+                    self._async_supports(probes, self.client.async_get_snapshot(0)),
+                    self._async_supports(probes, self.client.async_get_coaxial_control_io_status(),
+                                         ClientResponseError),
+                    self._async_supports(probes, self.client.async_get_disarming_linkage()),
+                    self._async_supports(probes, self.client.async_get_event_notifications()),
+                    self._async_supports(probes, self.client.async_get_smart_motion_detection()),
+                    self._async_supports(probes,
+                                         self.client.async_get_config_lighting(self._channel, self._profile_mode)),
+                    self._async_supports(probes, self.client.async_get_lighting_v2()),
+                )
+
+                # If able to take a snapshot with index 0 then most likely this cams channel needs to be reset
+                # but check if unit is not a doorbell first as channel 0 doesnt exist for VTOs
+                if snapshot_at_index_0 and not self.is_doorbell():
+                    self._channel_number = self._channel
                 _LOGGER.info("Using channel number %s", self._channel_number)
-
-                try:
-                    await self.client.async_get_coaxial_control_io_status()
-                    self._supports_coaxial_control = True
-                except ClientResponseError:
-                    self._supports_coaxial_control = False
                 _LOGGER.info("Device supports Coaxial Control=%s", self._supports_coaxial_control)
-
-                try:
-                    await self.client.async_get_disarming_linkage()
-                    self._supports_disarming_linkage = True
-                except ClientError:
-                    self._supports_disarming_linkage = False
                 _LOGGER.info("Device supports disarming linkage=%s", self._supports_disarming_linkage)
-
-                try:
-                    await self.client.async_get_event_notifications()
-                    self._supports_event_notifications = True
-                except ClientError:
-                    self._supports_event_notifications = False
                 _LOGGER.info("Device supports event notifications=%s", self._supports_event_notifications)
-
-                # Smart motion detection is enabled/disabled/fetched differently on Dahua devices compared to Amcrest
-                # The following lines are for Dahua devices
-                try:
-                    await self.client.async_get_smart_motion_detection()
-                    self._supports_smart_motion_detection = True
-                except ClientError:
-                    self._supports_smart_motion_detection = False
                 _LOGGER.info("Device supports smart motion detection=%s", self._supports_smart_motion_detection)
 
                 is_doorbell = self.is_doorbell()
@@ -274,21 +335,11 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
 
                 self._supports_floodlightmode = self.supports_floodlightmode()
 
-                try:
-                    await self.client.async_get_config_lighting(self._channel, self._profile_mode)
-                    self._supports_lighting = True
-                except ClientError:
-                    self._supports_lighting = False
-                    pass
-                _LOGGER.info("Device supports infrared lighting=%s", self.supports_infrared_light())
+                # The model and lighting support don't change after init so work this out once
+                self._supports_infrared_light = self._supports_lighting and "-AS-PV" not in self.model and \
+                    "-AS-NI" not in self.model and "LED-S2" not in self.model  # IPC-HFW2439SP-SA-LED-S2 also has no infrared light
+                _LOGGER.info("Device supports infrared lighting=%s", self._supports_infrared_light)
 
-#Checking lighting_v2 support
-                try:
-                    await self.client.async_get_lighting_v2()
-                    self._supports_lighting_v2 = True
-                except ClientError:
-                    self._supports_lighting_v2 = False
-                    pass
                 _LOGGER.info("Device supports Lighting_V2=%s", self._supports_lighting_v2)
 
 
@@ -312,6 +363,8 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
                     await self.async_start_vto_event_listener()
 
                 self.initialized = True
+            except ConfigEntryNotReady:
+                raise
             except Exception as exception:
                 _LOGGER.error("Failed to initialize device at %s", self._address, exc_info=exception)
                 raise PlatformNotReady("Dahua device at " + self._address + " isn't fully initialized yet")
@@ -374,7 +427,7 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
 
     def on_receive_vto_event(self, event: dict):
         event["DeviceName"] = self.get_device_name()
-        _LOGGER.debug(f"VTO Data received: {event}")
+        _LOGGER.debug("VTO Data received: %s", event)
         self.hass.bus.fire("dahua_event_received", event)
 
         # Example events:
@@ -416,9 +469,8 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
             card_id = event.get("Data", {}).get("CardNo", "")
             if card_id:
                 card_id_md5 = hashlib.md5(card_id.encode()).hexdigest()
-                asyncio.run_coroutine_threadsafe(
-                    async_scan_tag(self.hass, card_id_md5, self.get_device_name()), self.hass.loop
-                ).result()
+                # We're called on the HA loop (from the VTO client) so we can't block waiting on this
+                self.hass.async_create_task(async_scan_tag(self.hass, card_id_md5, self.get_device_name()))
 
         listener = self._dahua_event_listeners.get(event_key)
         if listener is not None:
@@ -464,26 +516,18 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         }
         """
         data = data_bytes.decode("utf-8", errors="ignore")
-        events = parse_event(data)
+        # This is a short term fix. Right now for NVRs this integration creates a task per channel to listen to
+        # events. Every task gets the same response. We need to discard events not for this channel, which
+        # parse_event does before it decodes any event data. Longer term work should create only a single task per
+        # channel.
+        events = parse_event(data, self._channel)
 
         if len(events) == 0:
             return
 
-        _LOGGER.debug(f"Events received from {self.get_address()} on channel {channel}: {events}")
+        _LOGGER.debug("Events received from %s on channel %s: %s", self.get_address(), channel, events)
 
         for event in events:
-            index = 0
-            if "index" in event:
-                try:
-                    index = int(event["index"])
-                except ValueError:
-                    index = 0
-
-            # This is a short term fix. Right now for NVRs this integration creates a thread per channel to listen to events. Every thread gets the same response. We need to
-            # discard events not for this channel. Longer term work should create only a single thread per channel.
-            if index != self._channel:
-                continue
-
             # Put the vent on the HA event bus
             event["name"] = self.get_device_name()
             event["DeviceName"] = self.get_device_name()
@@ -592,11 +636,9 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
     def supports_infrared_light(self) -> bool:
         """
         Returns true if this camera has an infrared light.  For example, the IPC-HDW3849HP-AS-PV does not, but most
-        others do. I don't know of a better way to detect this
+        others do. I don't know of a better way to detect this. This is computed once during initialization
         """
-        if not self._supports_lighting:
-            return False
-        return "-AS-PV" not in self.model and "-AS-NI" not in self.model and "LED-S2" not in self.model     #IPC-HFW2439SP-SA-LED-S2 also has no infrared light
+        return self._supports_infrared_light
 
     def supports_floodlightmode(self) -> bool:
         """ Returns true if this camera supports floodlight mode """
@@ -727,6 +769,15 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         """Returns the max number of streams supported by the device. All streams might not be enabled though"""
         return self._max_streams
 
+    def get_available_streams(self) -> list[int]:
+        """
+        Returns the stream indexes the device can serve. The main stream is index 0. Falls back to all of the max
+        streams if we couldn't read the encode config from the device
+        """
+        if self._available_streams is None or self._max_streams <= 0:
+            return list(range(self._max_streams))
+        return self._available_streams
+
     def supports_smart_motion_detection(self) -> bool:
         """ True if smart motion detection is supported"""
         return self._supports_smart_motion_detection
@@ -740,14 +791,14 @@ class DahuaDataUpdateCoordinator(DataUpdateCoordinator):
         Returns an instance of the connected VTO client if this is a VTO device. We need this because there's different
         ways to call a VTO device and the VTO client will handle that. For example, to hang up a call
         """
-        return self.dahua_vto_event_thread.vto_client
+        return self.dahua_vto_event_task.vto_client
 
 
 async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     """Handle removal of an entry."""
     coordinator = hass.data[DOMAIN][entry.entry_id]
-    coordinator.dahua_event_thread.stop()
-    coordinator.dahua_vto_event_thread.stop()
+    coordinator.dahua_event_task.stop()
+    coordinator.dahua_vto_event_task.stop()
     unloaded = all(
         await asyncio.gather(
             *[
@@ -759,6 +810,8 @@ async def async_unload_entry(hass: HomeAssistant, entry: ConfigEntry) -> bool:
     )
     if unloaded:
         hass.data[DOMAIN].pop(entry.entry_id)
+        # Each coordinator owns its sessions, close them so the pooled connections don't leak on reload
+        await coordinator.async_stop(None)
 
     return unloaded
 
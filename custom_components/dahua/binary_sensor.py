@@ -63,7 +63,7 @@ async def async_setup_entry(hass: HomeAssistant, entry, async_add_devices):
 class DahuaEventSensor(DahuaBaseEntity, BinarySensorEntity):
     """
     dahua binary_sensor class to record events. Many of these events are configured in the camera UI by going to:
-    Setting -> Event -> IVS -> and adding a tripwire rule, etc. See the DahuaEventThread in thread.py on how we connect
+    Setting -> Event -> IVS -> and adding a tripwire rule, etc. See the DahuaEventTask in thread.py on how we connect
     to the cammera to listen to events.
     """
 
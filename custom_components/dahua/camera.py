@@ -43,19 +43,21 @@ async def async_setup_entry(hass: HomeAssistant, config_entry, async_add_entitie
     """Add a Dahua IP camera from a config entry."""
 
     coordinator: DahuaDataUpdateCoordinator = hass.data[DOMAIN][config_entry.entry_id]
-    max_streams = coordinator.get_max_streams()
+    stream_indexes = coordinator.get_available_streams()
+    if not stream_indexes:
+        return
 
     # Note the stream_index is 0 based. The main stream is index 0
-    for stream_index in range(max_streams):
-        async_add_entities(
-            [
-                DahuaCamera(
-                    coordinator,
-                    stream_index,
-                    config_entry,
-                )
-            ]
-        )
+    async_add_entities(
+        [
+            DahuaCamera(
+                coordinator,
+                stream_index,
+                config_entry,
+            )
+            for stream_index in stream_indexes
+        ]
+    )
 
     platform = entity_platform.async_get_current_platform()
 
@@ -2,8 +2,9 @@
 import logging
 import socket
 import asyncio
+import time
+from typing import Optional
 import aiohttp
-import async_timeout
 
 from .digest import DigestAuth
 from hashlib import md5
@@ -11,9 +12,119 @@ from hashlib import md5
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 TIMEOUT_SECONDS = 20
+# Passed to aiohttp for each API request (instead of wrapping every request in our own timeout)
+REQUEST_TIMEOUT = aiohttp.ClientTimeout(total=TIMEOUT_SECONDS, connect=TIMEOUT_SECONDS)
+# What _request does with the response body
+RESPONSE_KEY_VALUE = 0  # Parse the key=value lines into a dict
+RESPONSE_VERIFY_OK = 1  # Raise unless the body is OK
+RESPONSE_OK = 2  # Return true if the body is OK
+RESPONSE_BYTES = 3  # Return the raw body
+# How long to cache things like the machine name that the user can change but rarely does
+CONFIG_CACHE_TTL_SECONDS = 300
+# The event stream never ends on its own. We ask for a heartbeat every 5 seconds so if nothing shows up for a while
+# the connection is dead and we should reconnect
+EVENT_STREAM_TIMEOUT = aiohttp.ClientTimeout(total=None, sock_connect=TIMEOUT_SECONDS, sock_read=60)
 SECURITY_LIGHT_TYPE = 1
 SIREN_TYPE = 2
 
+# Common CGI endpoint prefixes. These are relative to the client's base URL (the get methods prepend it)
+CGI_CONFIG_GET = "/cgi-bin/configManager.cgi?action=getConfig&name="
+CGI_CONFIG_SET = "/cgi-bin/configManager.cgi?action=setConfig&"
+CGI_MAGIC_BOX = "/cgi-bin/magicBox.cgi?action="
+CGI_COAXIAL_CONTROL = "/cgi-bin/coaxialControlIO.cgi?action="
+
+# Dahua APIs want lower case true/false
+_BOOL_STR = {True: "true", False: "false"}
+# Light mode for on/off
+_LIGHT_MODE = {True: "Manual", False: "Off"}
+# Coaxial control IO value for on/off
+_COAXIAL_IO = {True: "1", False: "2"}
+
+# Lower case mode -> API value. Anything not in here is "day"
+_VIDEO_PROFILE_MODE = {"night": "1"}
+_NIGHT_SWITCH_MODE = {"night": "3"}
+
+# Lower case inputs -> the values the API wants
+_DAY_NIGHT_CONFIG = {"day": "0", "night": "1", "general": "2"}
+_DAY_NIGHT_MODE = {"auto": "Brightness", "brightness": "Brightness", "color": "Color", "blackwhite": "BlackWhite"}
+_LIGHTING_V1_MODE = {"on": "Manual", "manual": "Manual", "off": "Off", "auto": "Auto"}
+_RECORD_MODE = {"auto": "0", "manual": "1", "on": "1", "off": "2"}
+_AMCREST_DOORBELL_LIGHT_MODE = {
+    "on": "ForceOn&Lighting_V2[0][0][1].State=On",
+    "strobe": "ForceOn&Lighting_V2[0][0][1].State=Flicker",
+    "flicker": "ForceOn&Lighting_V2[0][0][1].State=Flicker",
+}
+# The keys we read from the coaxial control IO status
+COAXIAL_CONTROL_IO_STATUS_KEYS = (b"status.status.Speaker", b"status.status.WhiteLight")
+
+# Each event in the multipart event stream starts with this boundary, followed by headers, a blank line, and the body
+EVENT_BOUNDARY = b"--myboundary"
+# If we somehow never see the end of an event don't buffer forever
+MAX_EVENT_BUFFER_BYTES = 1024 * 1024
+
+# When the event stream drops we reconnect after 1, 2, 4, ... seconds, up to this many seconds between attempts
+MAX_EVENT_RECONNECT_DELAY_SECONDS = 30
+
+
+def _complete_events_end(buffer: bytearray) -> int:
+    """
+    Given the buffered event stream, returns how many bytes at the start of the buffer are complete events. TCP can
+    split an event across reads, so everything before the last boundary is complete, and the part after it is complete
+    once its Content-Length worth of body has arrived. If the device doesn't send a Content-Length we treat what we
+    have as complete, and if there's no boundary at all we pass everything through like we always have.
+    """
+    # Never hand off the start of the next boundary if the read stopped part way through it
+    end = len(buffer)
+    for size in range(min(len(EVENT_BOUNDARY) - 1, end), 0, -1):
+        if buffer.endswith(EVENT_BOUNDARY[:size]):
+            end -= size
+            break
+
+    last = buffer.rfind(EVENT_BOUNDARY)
+    if last < 0:
+        return end
+
+    content_length = None
+    line_start = buffer.find(b"\n", last)
+    while True:
+        if line_start < 0:
+            # The headers haven't all arrived yet
+            return last
+        line_end = buffer.find(b"\n", line_start + 1)
+        if line_end < 0:
+            return last
+        name, _, value = bytes(buffer[line_start + 1:line_end]).partition(b":")
+        name = name.strip()
+        if not name:
+            # Blank line, the body starts after it
+            body_start = line_end + 1
+            break
+        if name.lower() == b"content-length":
+            try:
+                content_length = int(value.strip())
+            except ValueError:
+                content_length = None
+        line_start = line_end
+
+    if content_length is None or end - body_start >= content_length:
+        return end
+    return last
+
+
+def _take_complete_events(buffer: bytearray) -> Optional[bytes]:
+    """
+    Removes the complete events from the start of the buffer and returns them, or None if there aren't any yet. If the
+    buffer grows past MAX_EVENT_BUFFER_BYTES without a complete event we hand it all off so it can't grow forever
+    """
+    end = _complete_events_end(buffer)
+    if end == 0:
+        if len(buffer) < MAX_EVENT_BUFFER_BYTES:
+            return None
+        end = len(buffer)
+    events = bytes(buffer[:end])
+    del buffer[:end]
+    return events
+
 
 class DahuaClient:
     """
@@ -23,6 +134,27 @@ class DahuaClient:
     events is the list of events used to monitor on the camera (For example, motion detection)
     """
 
+    # One client is created per camera/channel so skip the per instance __dict__. Add new attributes here
+    __slots__ = (
+        "_username",
+        "_password",
+        "_address",
+        "_session",
+        "_event_session",
+        "_auth",
+        "_event_auth",
+        "_events_url",
+        "_port",
+        "_rtsp_port",
+        "_base",
+        "_rtsp_prefix",
+        "_rtsp_short",
+        "_unique_cam_id",
+        "_ivs_rule_indexes",
+        "_cache",
+        "_cache_locks",
+    )
+
     def __init__(
             self,
             username: str,
@@ -30,38 +162,50 @@ class DahuaClient:
             address: str,
             port: int,
             rtsp_port: int,
-            session: aiohttp.ClientSession
+            session: aiohttp.ClientSession,
+            event_session: aiohttp.ClientSession = None
     ) -> None:
         self._username = username
         self._password = password
         self._address = address
         self._session = session
+        # The event stream holds its connection open forever. Give it its own session (if we have one) so it never
+        # takes a connection away from the short API requests
+        self._event_session = event_session if event_session is not None else session
+        # Reuse the digest auth (and the challenge it got from the device) so we don't have to take a 401 round trip
+        # before every single request
+        self._auth = DigestAuth(username, password, session)
+        self._event_auth = DigestAuth(username, password, self._event_session)
+        # (events, url) of the last event stream we connected to. It's the same every time we reconnect
+        self._events_url = None
         self._port = port
         self._rtsp_port = rtsp_port
 
         protocol = "https" if int(port) == 443 else "http"
         self._base = "{0}://{1}:{2}".format(protocol, address, port)
 
+        # Only the channel and subtype change between RTSP urls
+        self._rtsp_prefix = f"rtsp://{username}:{password}@{address}:{rtsp_port}/cam/realmonitor?channel="
+        self._rtsp_short = f"rtsp://{username}:{password}@{address}"
+
+        # Fallback id used when the device won't give us a serial number or name. It never changes so compute it once
+        not_hashed_id = "{0}_{1}_{2}_{3}".format(address, rtsp_port, username, password)
+        self._unique_cam_id = md5(not_hashed_id.encode('UTF-8')).hexdigest()
+
+        # channel -> the IVS rule indexes that exist on the device. Saves a getConfig before every enable/disable all
+        self._ivs_rule_indexes: dict = {}
+
+        # url -> (expires at, response) for the device info APIs that don't change (vendor, version, etc). See _get_cached
+        self._cache: dict = {}
+        self._cache_locks: dict = {}
+
     def get_rtsp_stream_url(self, channel: int, subtype: int) -> str:
         """
         Returns the RTSP url for the supplied subtype (subtype is 0=Main stream, 1=Sub stream)
         """
-        url = "rtsp://{0}:{1}@{2}:{3}/cam/realmonitor?channel={4}&subtype={5}".format(
-            self._username,
-            self._password,
-            self._address,
-            self._rtsp_port,
-            channel,
-            subtype,
-        )
         if subtype == 3:
-            url = "rtsp://{0}:{1}@{2}".format(
-                self._username,
-                self._password,
-                self._address,
-            )
-
-        return url
+            return self._rtsp_short
+        return f"{self._rtsp_prefix}{channel}&subtype={subtype}"
 
     async def async_get_snapshot(self, channel_number: int) -> bytes:
         """
@@ -70,7 +214,7 @@ class DahuaClient:
         so channel index 0 is channel number 1. Except for some older firmwares where channel
         and channel number are the same!
         """
-        url = "/cgi-bin/snapshot.cgi?channel={0}".format(channel_number)
+        url = f"/cgi-bin/snapshot.cgi?channel={channel_number}"
         return await self.get_bytes(url)
 
     async def async_get_system_info(self) -> dict:
@@ -86,11 +230,23 @@ class DahuaClient:
         updateSerialCloudUpgrade=IPC-HDW5830R-Z:07:01:08:70:52:00:09:0E:03:00:04:8F0:00:00:00:00:00:02:00:00:600
         """
         try:
-            return await self.get("/cgi-bin/magicBox.cgi?action=getSystemInfo")
+            return await self._get_cached("/cgi-bin/magicBox.cgi?action=getSystemInfo")
         except aiohttp.ClientResponseError as e:
-            not_hashed_id = "{0}_{1}_{2}_{3}".format(self._address, self._rtsp_port, self._username, self._password)
-            unique_cam_id = md5(not_hashed_id.encode('UTF-8')).hexdigest()
-            return {"serialNumber": unique_cam_id}
+            return {"serialNumber": self._unique_cam_id}
+
+    async def async_get_device_identity(self) -> dict:
+        """
+        Returns the machine name, system info (serial number, device type, etc), and software version in one dict.
+        magicBox.cgi only takes one action per request so the calls are made concurrently instead
+        """
+        data = {}
+        for result in await asyncio.gather(
+                self.async_get_machine_name(),
+                self.async_get_system_info(),
+                self.get_software_version(),
+        ):
+            data.update(result)
+        return data
 
     async def get_device_type(self) -> dict:
         """
@@ -101,7 +257,7 @@ class DahuaClient:
         type=IP Camera
         """
         try:
-            return await self.get("/cgi-bin/magicBox.cgi?action=getDeviceType")
+            return await self._get_cached("/cgi-bin/magicBox.cgi?action=getDeviceType")
         except aiohttp.ClientResponseError as e:
             return {"type": "Generic RTSP"}
 
@@ -111,34 +267,39 @@ class DahuaClient:
         version=2.800.0000016.0.R,build:2020-06-05
         """
         try:
-            return await self.get("/cgi-bin/magicBox.cgi?action=getSoftwareVersion")
+            return await self._get_cached("/cgi-bin/magicBox.cgi?action=getSoftwareVersion")
         except aiohttp.ClientResponseError as e:
             return {"version": "1.0"}
 
     async def get_machine_name(self) -> dict:
         """ get_machine_name returns the device name. Example response: name=FrontDoorCam """
         try:
-            return await self.get("/cgi-bin/magicBox.cgi?action=getMachineName")
+            return await self._get_cached("/cgi-bin/magicBox.cgi?action=getMachineName", CONFIG_CACHE_TTL_SECONDS)
         except aiohttp.ClientResponseError as e:
-            not_hashed_id = "{0}_{1}_{2}_{3}".format(self._address, self._rtsp_port, self._username, self._password)
-            unique_cam_id = md5(not_hashed_id.encode('UTF-8')).hexdigest()
-            return {"name": unique_cam_id}
+            return {"name": self._unique_cam_id}
 
     async def get_vendor(self) -> dict:
         """ get_vendor returns the vendor. Example response: vendor=Dahua """
         try:
-            return await self.get("/cgi-bin/magicBox.cgi?action=getVendor")
+            return await self._get_cached("/cgi-bin/magicBox.cgi?action=getVendor")
         except aiohttp.ClientResponseError as e:
             return {"vendor": "Generic RTSP"}
 
     async def reboot(self) -> dict:
         """ Reboots the device """
-        return await self.get("/cgi-bin/magicBox.cgi?action=reboot")
+        result = await self.get("/cgi-bin/magicBox.cgi?action=reboot")
+        # The firmware could be different when it comes back up
+        self.invalidate_identity()
+        return result
+
+    def invalidate_identity(self):
+        """ Forgets the cached device info so the next calls fetch it from the device again """
+        self._cache.clear()
 
     async def get_max_extra_streams(self) -> int:
         """ get_max_extra_streams returns the max number of sub streams supported by the camera """
         try:
-            result = await self.get("/cgi-bin/magicBox.cgi?action=getProductDefinition&name=MaxExtraStream")
+            result = await self._get_cached("/cgi-bin/magicBox.cgi?action=getProductDefinition&name=MaxExtraStream")
             return int(result.get("table.MaxExtraStream", "2"))
         except aiohttp.ClientResponseError as e:
             pass
@@ -157,7 +318,9 @@ class DahuaClient:
         status.status.WhiteLight=Off
         """
         url = "/cgi-bin/coaxialControlIO.cgi?action=getStatus&channel=1"
-        return await self.get(url)
+        # This is polled on every refresh and we only care about 2 keys, so skip the general parser
+        data = await self.get_bytes(url)
+        return self.parse_keys(data, COAXIAL_CONTROL_IO_STATUS_KEYS)
 
     async def async_get_lighting_v2(self) -> dict:
         """
@@ -186,16 +349,14 @@ class DahuaClient:
         """
         url = "/cgi-bin/configManager.cgi?action=getConfig&name=General.MachineName"
         try:
-            return await self.get(url)
+            return await self._get_cached(url, CONFIG_CACHE_TTL_SECONDS)
         except aiohttp.ClientResponseError as e:
-            not_hashed_id = "{0}_{1}_{2}_{3}".format(self._address, self._rtsp_port, self._username, self._password)
-            unique_cam_id = md5(not_hashed_id.encode('UTF-8')).hexdigest()
-            return {"table.General.MachineName": unique_cam_id}
+            return {"table.General.MachineName": self._unique_cam_id}
 
     async def async_get_config(self, name) -> dict:
         """ async_get_config gets a config by name """
         # example name=Lighting[0][0]
-        url = "/cgi-bin/configManager.cgi?action=getConfig&name={0}".format(name)
+        url = CGI_CONFIG_GET + name
         try:
             return await self.get(url)
         except aiohttp.ClientResponseError as e:
@@ -257,33 +418,40 @@ class DahuaClient:
         """
         Sets all IVS rules to enabled or disabled
         """
-        rules = await self.async_get_ivs_rules()
-        # Supporting up to a max of 11 rules. Just because 11 seems like a high enough number
-        rules_set = []
-        for index in range(10):
-            rule = "table.VideoAnalyseRule[{0}][{1}].Enable".format(channel, index)
-            if rule in rules:
-                rules_set.append("VideoAnalyseRule[{0}][{1}].Enable={2}".format(channel, index, str(enabled).lower()))
+        indexes = self._ivs_rule_indexes.get(channel)
+        if indexes is None:
+            rules = await self.async_get_ivs_rules()
+            # Supporting up to a max of 11 rules. Just because 11 seems like a high enough number
+            indexes = [index for index in range(10)
+                       if "table.VideoAnalyseRule[{0}][{1}].Enable".format(channel, index) in rules]
+            self._ivs_rule_indexes[channel] = indexes
+
+        # Only the rule index changes between each rule so fill in the channel and value once
+        rule_template = "VideoAnalyseRule[" + str(channel) + "][{0}].Enable=" + _BOOL_STR[enabled]
+        rules_set = [rule_template.format(index) for index in indexes]
 
-        if len(rules_set) > 0:
-            url = "/cgi-bin/configManager.cgi?action=setConfig&" + "&".join(rules_set)
-            return await self.get(url, True)
+        if rules_set:
+            url = CGI_CONFIG_SET + "&".join(rules_set)
+            try:
+                return await self.get(url, True)
+            except Exception:
+                # The rules might have changed on the device, fetch them again next time
+                self._ivs_rule_indexes.pop(channel, None)
+                raise
 
     async def async_set_ivs_rule(self, channel: int, index: int, enabled: bool):
         """ Sets and IVS rules to enabled or disabled. This also works for Amcrest smart motion detection"""
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoAnalyseRule[{0}][{1}].Enable={2}".format(
-            channel, index, str(enabled).lower()
-        )
+        url = f"{CGI_CONFIG_SET}VideoAnalyseRule[{channel}][{index}].Enable={_BOOL_STR[enabled]}"
         return await self.get(url, True)
 
     async def async_enabled_smart_motion_detection(self, enabled: bool):
         """ Enables or disabled smart motion detection for Dahua devices (doesn't work for Amcrest)"""
-        url = "/cgi-bin/configManager.cgi?action=setConfig&SmartMotionDetect[0].Enable={0}".format(str(enabled).lower())
+        url = CGI_CONFIG_SET + "SmartMotionDetect[0].Enable=" + _BOOL_STR[enabled]
         return await self.get(url, True)
 
     async def async_set_light_global_enabled(self, enabled: bool):
         """ Turns the blue ring light on/off for Amcrest doorbells """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&LightGlobal[0].Enable={0}".format(str(enabled).lower())
+        url = CGI_CONFIG_SET + "LightGlobal[0].Enable=" + _BOOL_STR[enabled]
         return await self.get(url, True)
 
     async def async_get_smart_motion_detection(self) -> dict:
@@ -320,32 +488,32 @@ class DahuaClient:
         # 2 - Manual (for manual switching)
         # 3 - Schedule
         # 4 - PIR
-        url = "/cgi-bin/configManager.cgi?action=setConfig&FloodLightMode.Mode={mode}".format(mode=mode)
+        url = f"{CGI_CONFIG_SET}FloodLightMode.Mode={mode}"
         return await self.get(url)
 
-    async def async_set_lighting_v1(self, channel: int, enabled: bool, brightness: int) -> dict:
-        """ async_get_lighting_v1 will turn the IR light (InfraRed light) on or off """
+    async def async_set_lighting_v1(self, channel: int, enabled: bool, brightness: int = None) -> dict:
+        """
+        async_get_lighting_v1 will turn the IR light (InfraRed light) on or off. If brightness is None the brightness
+        on the device is left alone
+        """
         # on = Manual, off = Off
-        mode = "Manual"
-        if not enabled:
-            mode = "Off"
+        mode = _LIGHT_MODE[enabled]
         return await self.async_set_lighting_v1_mode(channel, mode, brightness)
 
-    async def async_set_lighting_v1_mode(self, channel: int, mode: str, brightness: int) -> dict:
+    async def async_set_lighting_v1_mode(self, channel: int, mode: str, brightness: int = None) -> dict:
         """
         async_set_lighting_v1_mode will set IR light (InfraRed light) mode and brightness
         Mode should be one of: Manual, Off, or Auto
-        Brightness should be between 0 and 100 inclusive. 100 being the brightest
+        Brightness should be between 0 and 100 inclusive. 100 being the brightest. None leaves it unchanged
         """
 
-        if mode.lower() == "on":
-            mode = "Manual"
-        # Dahua api expects the first char to be capital
-        mode = mode.capitalize()
+        # Dahua api expects the first char to be capital. Anything we don't know about just gets capitalized
+        mode = _LIGHTING_V1_MODE.get(mode.lower()) or mode.capitalize()
 
-        url = "/cgi-bin/configManager.cgi?action=setConfig&Lighting[{channel}][0].Mode={mode}&Lighting[{channel}][0].MiddleLight[0].Light={brightness}".format(
-            channel=channel, mode=mode, brightness=brightness
-        )
+        ch = str(channel)
+        url = CGI_CONFIG_SET + "Lighting[" + ch + "][0].Mode=" + mode
+        if brightness is not None:
+            url += "&Lighting[" + ch + "][0].MiddleLight[0].Light=" + str(brightness)
         return await self.get(url)
 
     async def async_set_video_profile_mode(self, channel: int, mode: str):
@@ -354,13 +522,9 @@ class DahuaClient:
         Mode should be one of: Day or Night
         """
 
-        if mode.lower() == "night":
-            mode = "1"
-        else:
-            # Default to "day", which is 0
-            mode = "0"
-
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoInMode[{0}].Config[0]={1}".format(channel, mode)
+        # Default to "day", which is 0
+        mode = _VIDEO_PROFILE_MODE.get(mode.lower(), "0")
+        url = CGI_CONFIG_SET + "VideoInMode[" + str(channel) + "].Config[0]=" + mode
         return await self.get(url, True)
 
     async def async_adjustfocus_v1(self, focus: str, zoom: str):
@@ -369,7 +533,7 @@ class DahuaClient:
         """
 
 
-        url = "/cgi-bin/devVideoInput.cgi?action=adjustFocus&focus={0}&zoom={1}".format(focus, zoom)
+        url = f"/cgi-bin/devVideoInput.cgi?action=adjustFocus&focus={focus}&zoom={zoom}"
         return await self.get(url, True)
 
     async def async_setprivacymask(self, index: int, enabled: bool):
@@ -378,9 +542,7 @@ class DahuaClient:
         """
 
 
-        url = "/cgi-bin/configManager.cgi?action=setConfig&PrivacyMasking[0][{0}].Enable={1}".format(
-            index, str(enabled).lower()
-        )
+        url = f"{CGI_CONFIG_SET}PrivacyMasking[0][{index}].Enable={_BOOL_STR[enabled]}"
         return await self.get(url, True)
 
     async def async_set_night_switch_mode(self, channel: int, mode: str):
@@ -390,86 +552,64 @@ class DahuaClient:
         Mode should be one of: Day or Night
         """
 
-        if mode.lower() == "night":
-            mode = "3"
-        else:
-            # Default to "day", which is 0
-            mode = "0"
-
-        url = f"/cgi-bin/configManager.cgi?action=setConfig&VideoInOptions[{channel}].NightOptions.SwitchMode={mode}"
+        # Default to "day", which is 0
+        mode = _NIGHT_SWITCH_MODE.get(mode.lower(), "0")
+        url = CGI_CONFIG_SET + "VideoInOptions[" + str(channel) + "].NightOptions.SwitchMode=" + mode
         _LOGGER.debug("Switching night mode: %s", url)
         return await self.get(url, True)
 
     async def async_enable_channel_title(self, channel: int, enabled: bool, ):
         """ async_set_enable_channel_title will enable or disables the camera's channel title overlay """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].ChannelTitle.EncodeBlend={1}".format(
-            channel, str(enabled).lower()
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = CGI_CONFIG_SET + "VideoWidget[" + str(channel) + "].ChannelTitle.EncodeBlend=" + _BOOL_STR[enabled]
+        if not await self._get_ok(url):
             raise Exception("Could enable/disable channel title")
 
     async def async_enable_time_overlay(self, channel: int, enabled: bool):
         """ async_set_enable_time_overlay will enable or disables the camera's time overlay """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].TimeTitle.EncodeBlend={1}".format(
-            channel, str(enabled).lower()
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = CGI_CONFIG_SET + "VideoWidget[" + str(channel) + "].TimeTitle.EncodeBlend=" + _BOOL_STR[enabled]
+        if not await self._get_ok(url):
             raise Exception("Could not enable/disable time overlay")
 
     async def async_enable_text_overlay(self, channel: int, group: int, enabled: bool):
         """ async_set_enable_text_overlay will enable or disables the camera's text overlay """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].CustomTitle[{1}].EncodeBlend={2}".format(
-            channel, group, str(enabled).lower()
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = CGI_CONFIG_SET + "VideoWidget[" + str(channel) + "].CustomTitle[" + str(group) + "].EncodeBlend=" + \
+            _BOOL_STR[enabled]
+        if not await self._get_ok(url):
             raise Exception("Could not enable/disable text overlay")
 
     async def async_enable_custom_overlay(self, channel: int, group: int, enabled: bool):
         """ async_set_enable_custom_overlay will enable or disables the camera's custom overlay """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].UserDefinedTitle[{1}].EncodeBlend={2}".format(
-            channel, group, str(enabled).lower()
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = CGI_CONFIG_SET + "VideoWidget[" + str(channel) + "].UserDefinedTitle[" + str(group) + "].EncodeBlend=" + \
+            _BOOL_STR[enabled]
+        if not await self._get_ok(url):
             raise Exception("Could not enable/disable customer overlay")
 
     async def async_set_service_set_channel_title(self, channel: int, text1: str, text2: str):
         """ async_set_service_set_channel_title sets the channel title """
         text = '|'.join(filter(None, [text1, text2]))
-        url = "/cgi-bin/configManager.cgi?action=setConfig&ChannelTitle[{0}].Name={1}".format(
-            channel, text
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = f"{CGI_CONFIG_SET}ChannelTitle[{channel}].Name={text}"
+        if not await self._get_ok(url):
             raise Exception("Could not set text")
 
     async def async_set_service_set_text_overlay(self, channel: int, group: int, text1: str, text2: str, text3: str,
                                                  text4: str):
         """ async_set_service_set_text_overlay sets the video text overlay """
         text = '|'.join(filter(None, [text1, text2, text3, text4]))
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].CustomTitle[{1}].Text={2}".format(
-            channel, group, text
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = f"{CGI_CONFIG_SET}VideoWidget[{channel}].CustomTitle[{group}].Text={text}"
+        if not await self._get_ok(url):
             raise Exception("Could not set text")
 
     async def async_set_service_set_custom_overlay(self, channel: int, group: int, text1: str, text2: str):
         """ async_set_service_set_custom_overlay sets the customer overlay on the video"""
         text = '|'.join(filter(None, [text1, text2]))
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoWidget[{0}].UserDefinedTitle[{1}].Text={2}".format(
-            channel, group, text
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        url = f"{CGI_CONFIG_SET}VideoWidget[{channel}].UserDefinedTitle[{group}].Text={text}"
+        if not await self._get_ok(url):
             raise Exception("Could not set text")
 
     async def async_set_lighting_v2(self, channel: int, enabled: bool, brightness: int, profile_mode: str) -> dict:
         """
         async_set_lighting_v2 will turn on or off the white light on the camera. If turning on, the brightness will be used.
+        If brightness is None the brightness on the device is left alone.
         brightness is in the range of 0 to 100 inclusive where 100 is the brightest.
         NOTE: this is not the same as the infrared (IR) light. This is the white visible light on the camera
 
@@ -477,12 +617,11 @@ class DahuaClient:
         """
 
         # on = Manual, off = Off
-        mode = "Manual"
-        if not enabled:
-            mode = "Off"
-        url = "/cgi-bin/configManager.cgi?action=setConfig&Lighting_V2[{channel}][{profile_mode}][0].Mode={mode}&Lighting_V2[{channel}][{profile_mode}][0].MiddleLight[0].Light={brightness}".format(
-            channel=channel, profile_mode=profile_mode, mode=mode, brightness=brightness
-        )
+        mode = _LIGHT_MODE[enabled]
+        prefix = "Lighting_V2[" + str(channel) + "][" + str(profile_mode) + "][0]."
+        url = CGI_CONFIG_SET + prefix + "Mode=" + mode
+        if brightness is not None:
+            url += "&" + prefix + "MiddleLight[0].Light=" + str(brightness)
         _LOGGER.debug("Turning light on: %s", url)
         return await self.get(url)
 
@@ -498,14 +637,11 @@ class DahuaClient:
         """
 
         # on = Manual, off = Off
-        mode = "Manual"
-        if not enabled:
-            mode = "Off"
-        url_base = "/cgi-bin/configManager.cgi?action=setConfig"
+        mode = _LIGHT_MODE[enabled]
         mode_cmnd = f'Lighting_V2[{channel}][{profile_mode}][1].Mode={mode}'
         # brightness_cmnd = f'Lighting_V2[{channel}][{profile_mode}][1].MiddleLight[0].Light={brightness}'
-        # url = f'{url_base}&{mode_cmnd}&{brightness_cmnd}'
-        url = f'{url_base}&{mode_cmnd}'
+        # url = f'{CGI_CONFIG_SET}{mode_cmnd}&{brightness_cmnd}'
+        url = CGI_CONFIG_SET + mode_cmnd
         _LOGGER.debug("Switching light: %s", url)
         return await self.get(url)
 
@@ -514,14 +650,9 @@ class DahuaClient:
         async_set_lighting_v2_for_amcrest_doorbells will turn on or off the white light on Amcrest doorbells
         mode: On, Off, Flicker
         """
-        mode = mode.lower()
-        cmd = "Off"
-        if mode == "on":
-            cmd = "ForceOn&Lighting_V2[0][0][1].State=On"
-        elif mode in ('strobe', 'flicker'):
-            cmd = "ForceOn&Lighting_V2[0][0][1].State=Flicker"
+        cmd = _AMCREST_DOORBELL_LIGHT_MODE.get(mode.lower(), "Off")
 
-        url = "/cgi-bin/configManager.cgi?action=setConfig&Lighting_V2[0][0][1].Mode={cmd}".format(cmd=cmd)
+        url = CGI_CONFIG_SET + "Lighting_V2[0][0][1].Mode=" + cmd
         _LOGGER.debug("Turning doorbell light on: %s", url)
         return await self.get(url)
 
@@ -535,27 +666,16 @@ class DahuaClient:
         """
 
         # Map the input to the Dahua required integer: 0=day, 1=night, 2=general
-        if config_type == "day":
-            config_no = 0
-        elif config_type == "night":
-            config_no = 1
-        else:
-            # general
-            config_no = 2
+        config_no = _DAY_NIGHT_CONFIG.get(config_type, "2")
 
-        # Map the mode
-        if mode is None or mode.lower() == "auto" or mode.lower() == "brightness":
+        # Map the mode. Unknown modes are passed through as is
+        if mode is None:
             mode = "Brightness"
-        elif mode.lower() == "color":
-            mode = "Color"
-        elif mode.lower() == "blackwhite":
-            mode = "BlackWhite"
-
-        url = "/cgi-bin/configManager.cgi?action=setConfig&VideoInDayNight[{0}][{1}].Mode={2}".format(
-            channel, str(config_no), mode
-        )
-        value = await self.get(url)
-        if "OK" not in value and "ok" not in value:
+        else:
+            mode = _DAY_NIGHT_MODE.get(mode.lower(), mode)
+
+        url = f"{CGI_CONFIG_SET}VideoInDayNight[{channel}][{config_no}].Mode={mode}"
+        if not await self._get_ok(url):
             raise Exception("Could not set Day/Night mode")
 
     async def async_get_video_in_mode(self) -> dict:
@@ -582,13 +702,11 @@ class DahuaClient:
         NOTE: this is not the same as the infrared (IR) light. This is the white visible light on the camera
         """
 
-        # on = 1, off = 0
-        io = "1"
-        if not enabled:
-            io = "2"
+        # on = 1, off = 2
+        io = _COAXIAL_IO[enabled]
 
-        url = "/cgi-bin/coaxialControlIO.cgi?action=control&channel={channel}&info[0].Type={dahua_type}&info[0].IO={io}".format(
-            channel=channel, dahua_type=dahua_type, io=io)
+        url = CGI_COAXIAL_CONTROL + "control&channel=" + str(channel) + "&info[0].Type=" + str(dahua_type) + \
+            "&info[0].IO=" + io
         _LOGGER.debug("Setting coaxial control state to %s: %s", io, url)
         return await self.get(url)
 
@@ -597,11 +715,8 @@ class DahuaClient:
         async_set_disarming_linkage will set the camera's disarming linkage (Event -> Disarming in the UI)
         """
 
-        value = "false"
-        if enabled:
-            value = "true"
-
-        url = "/cgi-bin/configManager.cgi?action=setConfig&DisableLinkage[{0}].Enable={1}".format(channel, value)
+        value = _BOOL_STR[enabled]
+        url = f"{CGI_CONFIG_SET}DisableLinkage[{channel}].Enable={value}"
         return await self.get(url)
 
     async def async_set_event_notifications(self, channel: int, enabled: bool) -> dict:
@@ -609,11 +724,9 @@ class DahuaClient:
         async_set_event_notifications will set the camera's disarming event notifications (Event -> Disarming -> Event Notifications in the UI)
         """
 
-        value = "true"
-        if enabled:
-            value = "false"
-
-        url = "/cgi-bin/configManager.cgi?action=setConfig&DisableEventNotify[{0}].Enable={1}".format(channel, value)
+        # The API "disables" notifications so the value is inverted
+        value = _BOOL_STR[not enabled]
+        url = f"{CGI_CONFIG_SET}DisableEventNotify[{channel}].Enable={value}"
         return await self.get(url)
 
     async def async_set_record_mode(self, channel: int, mode: str) -> dict:
@@ -622,13 +735,8 @@ class DahuaClient:
         mode should be one of: auto, manual, or off
         """
 
-        if mode.lower() == "auto":
-            mode = "0"
-        elif mode.lower() == "manual" or mode.lower() == "on":
-            mode = "1"
-        elif mode.lower() == "off":
-            mode = "2"
-        url = "/cgi-bin/configManager.cgi?action=setConfig&RecordMode[{0}].Mode={1}".format(channel, mode)
+        mode = _RECORD_MODE.get(mode.lower(), mode)
+        url = f"{CGI_CONFIG_SET}RecordMode[{channel}].Mode={mode}"
         _LOGGER.debug("Setting record mode: %s", url)
         return await self.get(url)
 
@@ -658,23 +766,22 @@ class DahuaClient:
         """
         async_access_control_open_door opens a door via a VTO
         """
-        url = "/cgi-bin/accessControl.cgi?action=openDoor&UserID=101&Type=Remote&channel={0}".format(door_id)
+        url = f"/cgi-bin/accessControl.cgi?action=openDoor&UserID=101&Type=Remote&channel={door_id}"
         return await self.get(url)
 
     async def enable_motion_detection(self, channel: int, enabled: bool) -> dict:
         """
         enable_motion_detection will either enable/disable motion detection on the camera depending on the value
         """
-        url = "/cgi-bin/configManager.cgi?action=setConfig&MotionDetect[{channel}].Enable={enabled}&MotionDetect[{channel}].DetectVersion=V3.0".format(
-            channel=channel, enabled=str(enabled).lower())
-        response = await self.get(url)
-
-        if "OK" in response:
-            return response
+        ch = str(channel)
+        value = _BOOL_STR[enabled]
+        url = CGI_CONFIG_SET + "MotionDetect[" + ch + "].Enable=" + value + "&MotionDetect[" + ch + \
+            "].DetectVersion=V3.0"
+        if await self._get_ok(url):
+            return {"OK": "OK"}
 
         # Some older cameras do not support the above API, so try this one
-        url = "/cgi-bin/configManager.cgi?action=setConfig&MotionDetect[{0}].Enable={1}".format(channel,
-                                                                                                str(enabled).lower())
+        url = CGI_CONFIG_SET + "MotionDetect[" + ch + "].Enable=" + value
         return await self.get(url)
 
     async def stream_events(self, on_receive, events: list, channel: int):
@@ -729,27 +836,52 @@ class DahuaClient:
         Note: Heartbeat message must be sent before heartbeat timeout
         """
         # Use codes=[All] for all codes
-        codes = ",".join(events)
-        url = "{0}/cgi-bin/eventManager.cgi?action=attach&codes=[{1}]&heartbeat=5".format(self._base, codes)
-        if self._username is not None and self._password is not None:
+        if self._events_url is None or self._events_url[0] != events:
+            codes = ",".join(events)
+            url = "{0}/cgi-bin/eventManager.cgi?action=attach&codes=[{1}]&heartbeat=5".format(self._base, codes)
+            self._events_url = (list(events), url)
+        url = self._events_url[1]
+        if self._username is None or self._password is None:
+            return
+
+        # Reconnect with a backoff when the stream drops instead of returning to the caller. We keep using the same
+        # DigestAuth so the challenge (and nonce) carries over and the reconnect can usually skip the 401 round trip.
+        # We only stop when we are cancelled or the session is closed, which happens when the integration unloads.
+        retries = 0
+        while not self._event_session.closed:
             response = None
-
             try:
-                auth = DigestAuth(self._username, self._password, self._session)
-                response = await auth.request("GET", url)
+                response = await self._event_auth.request("GET", url, timeout=EVENT_STREAM_TIMEOUT)
                 response.raise_for_status()
 
                 # https://docs.aiohttp.org/en/stable/streams.html
-                async for data, _ in response.content.iter_chunks():
-                    on_receive(data, channel)
-            except Exception as exception:
-                pass
+                # Reads don't line up with events so buffer until we have whole events before handing them off
+                buffer = bytearray()
+                async for data in response.content.iter_any():
+                    # Only a stream that actually sends something resets the backoff. Some devices answer 200 and then
+                    # hang up right away, and those shouldn't get a new connection every second forever
+                    retries = 0
+                    buffer += data
+                    complete = _take_complete_events(buffer)
+                    # Most of what we get is the heartbeat, which has nothing for on_receive to parse
+                    if complete is not None and b"Code=" in complete:
+                        on_receive(complete, channel)
+            except Exception as exception:  # pylint: disable=broad-except
+                _LOGGER.debug("Event stream from %s ended: %s", self._address, exception)
             finally:
                 if response is not None:
                     response.close()
 
+            if self._event_session.closed:
+                return
+
+            delay = min(2 ** retries, MAX_EVENT_RECONNECT_DELAY_SECONDS)
+            retries += 1
+            _LOGGER.debug("Reconnecting to the event stream from %s in %s seconds", self._address, delay)
+            await asyncio.sleep(delay)
+
     @staticmethod
-    async def parse_dahua_api_response(data: str) -> dict:
+    def parse_dahua_api_response(data: str) -> dict:
         """
         Dahua APIs return back text that looks like this:
 
@@ -758,49 +890,104 @@ class DahuaClient:
 
         We'll convert that to a dictionary like {"key1":"value1", "key2":"value2"}
         """
-        lines = data.splitlines()
         data_dict = {}
-        for line in lines:
-            parts = line.split("=", 1)
-            if len(parts) == 2:
-                data_dict[parts[0]] = parts[1]
-            else:
-                # We didn't get a key=value. We just got a key. Just stick it in the dictionary and move on
-                data_dict[parts[0]] = line
+        for line in data.splitlines():
+            # partition stops at the first "=" and doesn't build a list like split does
+            key, sep, value = line.partition("=")
+            # If we didn't get a key=value we just got a key (like "OK"). Just stick it in the dictionary and move on
+            data_dict[key] = value if sep else line
         return data_dict
 
+    async def _get_cached(self, url: str, ttl: float = None) -> dict:
+        """
+        Like get but remembers the successful response, forever if ttl is None or for ttl seconds. Only use this for
+        APIs that return data that doesn't change (or rarely changes) while we're running, like the vendor or software
+        version. Errors aren't cached.
+        """
+        cached = self._cache.get(url)
+        if cached is None or cached[0] < time.monotonic():
+            # Lock per url so concurrent callers (at startup) don't all hit the device for the same thing
+            lock = self._cache_locks.setdefault(url, asyncio.Lock())
+            async with lock:
+                cached = self._cache.get(url)
+                if cached is None or cached[0] < time.monotonic():
+                    expires = time.monotonic() + ttl if ttl is not None else float("inf")
+                    cached = (expires, await self.get(url))
+                    self._cache[url] = cached
+        # Callers like to update the dict they get back so hand out a copy
+        return dict(cached[1])
+
+    @staticmethod
+    def parse_keys(data: bytes, keys: tuple) -> dict:
+        """
+        A faster version of parse_dahua_api_response for when we only need a few known keys out of a key=value
+        response. keys are bytes and must match from the start of a line. Missing keys are left out of the result
+        """
+        result = {}
+        for key in keys:
+            needle = key + b"="
+            start = data.find(needle)
+            # Make sure we matched a whole key and not the end of a longer one
+            while start > 0 and data[start - 1] != 0x0A:
+                start = data.find(needle, start + 1)
+            if start < 0:
+                continue
+            start += len(needle)
+            end = data.find(b"\n", start)
+            if end < 0:
+                end = len(data)
+            result[key.decode()] = data[start:end].rstrip(b"\r").decode()
+        return result
+
+    async def _get_ok(self, url: str) -> bool:
+        """
+        For setters where the device just replies with OK. Returns true if it did, without parsing the response into
+        a dict first
+        """
+        return await self._request(url, RESPONSE_OK)
+
     async def get_bytes(self, url: str) -> bytes:
         """Get information from the API. This will return the raw response and not process it"""
-        async with async_timeout.timeout(TIMEOUT_SECONDS):
-            response = None
-            try:
-                auth = DigestAuth(self._username, self._password, self._session)
-                response = await auth.request("GET", self._base + url)
-                response.raise_for_status()
-
-                return await response.read()
-            finally:
-                if response is not None:
-                    response.close()
+        return await self._request(url, RESPONSE_BYTES)
 
     async def get(self, url: str, verify_ok=False) -> dict:
         """Get information from the API."""
+        return await self._request(url, RESPONSE_VERIFY_OK if verify_ok else RESPONSE_KEY_VALUE)
+
+    async def _request(self, url: str, response_type: int):
+        """
+        Makes a GET request to the API. All the get methods go through here so auth, timeouts, and connection handling
+        live in one place. response_type is one of the RESPONSE_* constants and says what to do with the response body
+        """
         url = self._base + url
         try:
-            async with async_timeout.timeout(TIMEOUT_SECONDS):
+            response = None
+            try:
+                response = await self._auth.request("GET", url, timeout=REQUEST_TIMEOUT)
+                response.raise_for_status()
+                raw = await response.read()
+                # We have the whole body, so hand the connection back to the pool for the next request. close() would
+                # throw away the keep-alive connection
+                response.release()
                 response = None
-                try:
-                    auth = DigestAuth(self._username, self._password, self._session)
-                    response = await auth.request("GET", url)
-                    response.raise_for_status()
-                    data = await response.text()
-                    if verify_ok:
-                        if data.lower().strip() != "ok":
-                            raise Exception(data)
-                    return await self.parse_dahua_api_response(data)
-                finally:
-                    if response is not None:
-                        response.close()
+                if response_type == RESPONSE_BYTES:
+                    return raw
+                if response_type == RESPONSE_OK:
+                    return raw.strip().lower() == b"ok"
+
+                # Responses are small and always UTF-8 (or plain ASCII) so decode it ourselves rather than have aiohttp
+                # work out the encoding on every request
+                data = raw.decode("utf-8", errors="replace")
+                if response_type == RESPONSE_VERIFY_OK:
+                    if data.lower().strip() != "ok":
+                        raise Exception(data)
+                    # Nothing to parse, it just said OK
+                    return {"OK": "OK"}
+                return self.parse_dahua_api_response(data)
+            finally:
+                # Only set if something went wrong before we read the whole body, don't reuse that connection
+                if response is not None:
+                    response.close()
         except asyncio.TimeoutError as exception:
             _LOGGER.warning("TimeoutError fetching information from %s", url)
             raise exception
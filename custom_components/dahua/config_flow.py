@@ -1,14 +1,12 @@
 """Adds config flow (UI flow) for Dahua IP cameras."""
+import asyncio
 import logging
-import ssl
 
 import voluptuous as vol
 
-from aiohttp import ClientSession, TCPConnector
-
 from homeassistant import config_entries
 from homeassistant.core import callback
-from homeassistant.helpers.aiohttp_client import async_create_clientsession
+from homeassistant.helpers.aiohttp_client import async_get_clientsession
 from homeassistant.helpers import config_validation as cv
 
 from .client import DahuaClient
@@ -21,7 +19,7 @@ from .const import (
     CONF_EVENTS,
     CONF_NAME,
     DOMAIN,
-    PLATFORMS,
+    PLATFORMS_SORTED,
     CONF_CHANNEL,
 )
 
@@ -30,18 +28,12 @@ https://developers.home-assistant.io/docs/config_entries_config_flow_handler
 https://developers.home-assistant.io/docs/data_entry_flow_index/
 """
 
-SSL_CONTEXT = ssl.create_default_context()
-#SSL_CONTEXT.minimum_version = ssl.TLSVersion.TLSv1_2
-SSL_CONTEXT.set_ciphers("DEFAULT")
-SSL_CONTEXT.check_hostname = False
-SSL_CONTEXT.verify_mode = ssl.CERT_NONE
-
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 DEFAULT_EVENTS = ["VideoMotion", "CrossLineDetection", "AlarmLocal", "VideoLoss", "VideoBlind", "AudioMutation",
                   "CrossRegionDetection", "SmartMotionHuman", "SmartMotionVehicle"]
 
-ALL_EVENTS = ["VideoMotion",
+ALL_EVENTS = ("VideoMotion",
               "VideoLoss",
               "AlarmLocal",
               "CrossLineDetection",
@@ -77,7 +69,22 @@ ALL_EVENTS = ["VideoMotion",
               "FireWarningInfo",
               "ObjectPlacementDetection",
               "ObjectRemovalDetection",
-              ]
+              )
+
+# The add camera form never changes so build it once instead of every time it's shown. DEFAULT_EVENTS stays a list
+# because it's handed back to us (and stored in the config entry) as the selected events, which multi_select expects
+# to be a list
+USER_SCHEMA = vol.Schema(
+    {
+        vol.Required(CONF_USERNAME): str,
+        vol.Required(CONF_PASSWORD): str,
+        vol.Required(CONF_ADDRESS): str,
+        vol.Required(CONF_PORT, default="80"): str,
+        vol.Required(CONF_RTSP_PORT, default="554"): str,
+        vol.Required(CONF_CHANNEL, default=0): int,
+        vol.Optional(CONF_EVENTS, default=DEFAULT_EVENTS): cv.multi_select(ALL_EVENTS),
+    }
+)
 
 """
 https://developers.home-assistant.io/docs/data_entry_flow_index
@@ -154,17 +161,7 @@ class DahuaFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
         """Show the configuration form to edit camera name."""
         return self.async_show_form(
             step_id="user",
-            data_schema=vol.Schema(
-                {
-                    vol.Required(CONF_USERNAME): str,
-                    vol.Required(CONF_PASSWORD): str,
-                    vol.Required(CONF_ADDRESS): str,
-                    vol.Required(CONF_PORT, default="80"): str,
-                    vol.Required(CONF_RTSP_PORT, default="554"): str,
-                    vol.Required(CONF_CHANNEL, default=0): int,
-                    vol.Optional(CONF_EVENTS, default=DEFAULT_EVENTS): cv.multi_select(ALL_EVENTS),
-                }
-            ),
+            data_schema=USER_SCHEMA,
             errors=self._errors,
         )
 
@@ -182,13 +179,13 @@ class DahuaFlowHandler(config_entries.ConfigFlow, domain=DOMAIN):
 
     async def _test_credentials(self, username, password, address, port, rtsp_port, channel):
         """Return name and serialNumber if credentials is valid."""
-        # Self signed certs are used over HTTPS so we'll disable SSL verification
-        connector = TCPConnector(enable_cleanup_closed=True, ssl=SSL_CONTEXT)
-        session = ClientSession(connector=connector)
+        # Self signed certs are used over HTTPS so we'll disable SSL verification. This is Home Assistant's shared
+        # session so we don't make (and leak) a new one per attempt
+        session = async_get_clientsession(self.hass, verify_ssl=False)
         try:
             client = DahuaClient(username, password, address, port, rtsp_port, session)
-            data = await client.get_machine_name()
-            serial = await client.async_get_system_info()
+            # These don't depend on each other so ask for both at the same time
+            data, serial = await asyncio.gather(client.get_machine_name(), client.async_get_system_info())
             data.update(serial)
             if "name" in data:
                 return data
@@ -215,15 +212,11 @@ class DahuaOptionsFlowHandler(config_entries.OptionsFlow):
             self.options.update(user_input)
             return await self._update_options()
 
-        return self.async_show_form(
-            step_id="user",
-            data_schema=vol.Schema(
-                {
-                    vol.Required(x, default=self.options.get(x, True)): bool
-                    for x in sorted(PLATFORMS)
-                }
-            ),
-        )
+        return self.async_show_form(step_id="user", data_schema=self._options_schema())
+
+    def _options_schema(self) -> vol.Schema:
+        """Returns the options schema. The defaults are the current options so it's built each time it's shown"""
+        return vol.Schema({vol.Required(x, default=self.options.get(x, True)): bool for x in PLATFORMS_SORTED})
 
     async def _update_options(self):
         """Update config entry options."""
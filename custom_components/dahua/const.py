@@ -30,6 +30,8 @@ LIGHT = "light"
 CAMERA = "camera"
 SELECT = "select"
 PLATFORMS = [BINARY_SENSOR, SWITCH, LIGHT, CAMERA, SELECT]
+# The options flow lists the platforms in this order
+PLATFORMS_SORTED = tuple(sorted(PLATFORMS))
 
 
 # Configuration and options
@@ -1,8 +1,18 @@
 """
 Various utilities for Dahua cameras
 """
-import json
-import re
+# orjson ships with Home Assistant and is a lot faster than the json module. Fall back just in case it's missing
+try:
+    from orjson import loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+# Each event in the event stream starts with this boundary. It's a plain string so a str.split is all we need. Some
+# devices end their lines with \r\n and others with \n so we don't include the line ending here
+EVENT_BOUNDARY = "--myboundary"
+
+# HASS brightness only goes from 0 to 255 so precompute every Dahua brightness
+_HASS_TO_DAHUA_BRIGHTNESS = tuple((i * 100) // 255 for i in range(256))
 
 
 def dahua_brightness_to_hass_brightness(bri_str: str) -> int:
@@ -14,8 +24,8 @@ def dahua_brightness_to_hass_brightness(bri_str: str) -> int:
     if bri_str:
         bri = int(bri_str)
 
-    current = bri / 100
-    return int(current * 255)
+    # Integer math gives the same results without going through floats
+    return (bri * 255) // 100
 
 
 def hass_brightness_to_dahua_brightness(hass_brightness: int) -> int:
@@ -24,11 +34,11 @@ def hass_brightness_to_dahua_brightness(hass_brightness: int) -> int:
     """
     if hass_brightness is None:
         hass_brightness = 100
-    return int((hass_brightness / 255) * 100)
+    return _HASS_TO_DAHUA_BRIGHTNESS[hass_brightness]
 
 
 # https://github.com/rroller/dahua/issues/166
-def parse_event(data: str) -> list[dict[str, any]]:
+def parse_event(data: str, channel: int = None) -> list[dict[str, any]]:
     # This will turn the event stream data into a list of events, where each item in the list is a dictionary and where
     # the key of the dictionary is the key is for example "Code" and the value is "VideoMotion", etc
     # That's a little hard to explain... so look at this example...
@@ -44,19 +54,20 @@ def parse_event(data: str) -> list[dict[str, any]]:
     #   "index":"0",
     #   ...
     # }]
+    #
+    # If channel is given, events for other channels (by their index, which defaults to 0) are skipped before we spend
+    # any time decoding their data
 
-    # We will split on "--myboundary" and then skip the first 3 lines so we end up with a string that starts with Code=
-    event_blocks = re.split(r'--myboundary\n', data)
+    # We will split on "--myboundary" and then jump straight to "Code=", skipping the headers in front of it
+    event_blocks = data.split(EVENT_BOUNDARY)
 
     events = []
 
     for event_block in event_blocks:
-        # Skip the first 3 lines... the first line looks like: Content-Type: text/plain
-        s = event_block.split("\n", 3)
-        if len(s) < 3:
-            continue
-        event_block = s[3].strip()
-        if not event_block.startswith("Code="):
+        event_block = event_block.strip()
+        # The headers look like: Content-Type: text/plain
+        start = event_block.find("Code=")
+        if start < 0:
             continue
 
         # At this point we'll have something that looks like this...
@@ -65,19 +76,36 @@ def parse_event(data: str) -> list[dict[str, any]]:
         #    "RegionName" : [ "Region1" ],
         #    "SmartMotionEnable" : true
         # }
-        # And we want to put each key/value pair into a dictionary...
-        event = dict()
-        for key_value in event_block.split(';'):
-            key, value = key_value.split('=')
-            event[key] = value
-
-        # data is a json string, convert it to real json and add it back to the output dic
-        if "data" in event:
+        # data is always last and its json can contain ";" and "=" so split it off first. Then we put each key/value
+        # pair before it into a dictionary...
+        data_start = event_block.find(";data=", start)
+        if data_start < 0:
+            head = event_block[start:].rstrip()
+            payload = None
+        else:
+            head = event_block[start:data_start]
+            payload = event_block[data_start + 6:].strip()
+
+        # partition only splits on the first "=" and doesn't raise when there isn't one, we just skip those
+        event = {key: value for key, sep, value in (kv.partition('=') for kv in head.split(';')) if sep}
+
+        if channel is not None:
             try:
-                data = json.loads(event["data"])
-                event["data"] = data
-            except Exception:  # pylint: disable=broad-except
-                pass
+                index = int(event.get("index", 0))
+            except ValueError:
+                index = 0
+            if index != channel:
+                continue
+
+        # data is a json string, convert it to real json and add it to the output dic. Some events send a plain value
+        # instead so only try to decode it when it looks like json, raising and catching the error isn't cheap
+        if payload is not None:
+            event["data"] = payload
+            if payload[:1] in ("{", "["):
+                try:
+                    event["data"] = json_loads(payload)
+                except ValueError:
+                    pass
         events.append(event)
 
     return events
@@ -28,29 +28,31 @@ class DigestAuth:
         self.last_nonce = previous.get("last_nonce", "")
         self.nonce_count = previous.get("nonce_count", 0)
         self.challenge = previous.get("challenge")
-        self.args = {}
         self.session = session
+        # HA1 only depends on the username, realm, and password so we only need to hash it once per realm
+        self._ha1_cache = {}
 
     async def request(self, method, url, *, headers=None, **kwargs):
-        """Makes a request"""
-        if headers is None:
-            headers = {}
-
-        # Save the args so we can re-run the request
-        self.args = {"method": method, "url": url, "headers": headers, "kwargs": kwargs}
-
-        if self.challenge:
-            authorization = self._build_digest_header(method.upper(), url)
-            headers["AUTHORIZATION"] = authorization
-
-        response = await self.session.request(method, url, headers=headers, **kwargs)
+        """
+        Makes a request. The same DigestAuth can be reused (and shared by concurrent requests) so once we have a
+        challenge every request sends the Authorization header up front instead of waiting for a 401 first
+        """
+        response = await self._request(method, url, headers, kwargs)
 
-        # Only try performing digest authentication if the response status is from 401
-        if response.status == 401:
-            return await self._handle_401(response)
+        # Only try performing digest authentication if the response status is from 401. That happens on the first
+        # request or when the device decides our nonce is stale. Only retry once so bad credentials don't loop forever
+        if response.status == 401 and self._handle_401(response):
+            response = await self._request(method, url, headers, kwargs)
 
         return response
 
+    async def _request(self, method, url, headers, kwargs):
+        # Our GETs don't send any headers of their own, so only build a headers dict when there is something to put in it
+        if self.challenge:
+            headers = dict(headers) if headers else {}
+            headers["AUTHORIZATION"] = self._build_digest_header(method.upper(), url)
+        return await self.session.request(method, url, headers=headers, **kwargs)
+
     def _build_digest_header(self, method, url):
         """
         :rtype: str
@@ -73,17 +75,21 @@ class DigestAuth:
         else:
             return ""
 
+        # Digest auth is what the device asks for, these hashes aren't protecting anything on our side
         def H(x):
-            return hash_fn(x.encode()).hexdigest()
+            return hash_fn(x.encode(), usedforsecurity=False).hexdigest()
 
         def KD(s, d):
             return H("%s:%s" % (s, d))
 
         path = URL(url).path_qs
-        A1 = "%s:%s:%s" % (self.username, realm, self.password)
         A2 = "%s:%s" % (method, path)
 
-        HA1 = H(A1)
+        ha1_key = (realm, hash_fn)
+        HA1 = self._ha1_cache.get(ha1_key)
+        if HA1 is None:
+            HA1 = H("%s:%s:%s" % (self.username, realm, self.password))
+            self._ha1_cache[ha1_key] = HA1
         HA2 = H(A2)
 
         if nonce == self.last_nonce:
@@ -104,7 +110,7 @@ class DigestAuth:
                 os.urandom(8).decode(errors="ignore"),
             ]
         ).encode()
-        cnonce = hashlib.sha1(cnonce_data).hexdigest()[:16]
+        cnonce = hashlib.sha1(cnonce_data, usedforsecurity=False).hexdigest()[:16]
 
         if algorithm == "MD5-SESS":
             HA1 = H("%s:%s:%s" % (HA1, nonce, cnonce))
@@ -134,10 +140,9 @@ class DigestAuth:
 
         return "Digest %s" % base
 
-    async def _handle_401(self, response: ClientResponse):
+    def _handle_401(self, response: ClientResponse) -> bool:
         """
-        Takes the given response and tries digest-auth, if needed.
-        :rtype: ClientResponse
+        Takes the given response and saves the digest challenge from it. Returns true if the request should be retried
         """
         auth_header = response.headers.get("www-authenticate", "")
 
@@ -147,15 +152,9 @@ class DigestAuth:
             response.close()
 
             self.challenge = parse_key_value_list(parts[1])
+            return True
 
-            return await self.request(
-                self.args["method"],
-                self.args["url"],
-                headers=self.args["headers"],
-                **self.args["kwargs"],
-            )
-
-        return response
+        return False
 
 
 def parse_pair(pair):
@@ -6,7 +6,7 @@ from .const import DOMAIN, ATTRIBUTION
 """
 For a list of entity types, see https://developers.home-assistant.io/docs/core/entity/
 """
-class DahuaBaseEntity(CoordinatorEntity):
+class DahuaBaseEntity(CoordinatorEntity[DahuaDataUpdateCoordinator]):
     """
     DahuaBaseEntity is the base entity for all Dahua entities
     """
@@ -15,29 +15,46 @@ class DahuaBaseEntity(CoordinatorEntity):
         super().__init__(coordinator)
         self.config_entry = config_entry
         self._coordinator = coordinator
+        # The channel is fixed by the config entry
+        self._channel = coordinator.get_channel()
 
-    # https://developers.home-assistant.io/docs/entity_registry_index
-    @property
-    def unique_id(self):
-        """Return a unique ID to use for this entity."""
-        return self._coordinator.get_serial_number()
-
-    # https://developers.home-assistant.io/docs/device_registry_index
-    @property
-    def device_info(self):
-        return {
-            "identifiers": {(DOMAIN, self._coordinator.get_serial_number())},
-            "name": self._coordinator.get_device_name(),
-            "model": self._coordinator.get_model(),
+        # None of these change while the entity is around, so set them once instead of asking the coordinator each
+        # time Home Assistant reads them. Entities override unique_id with their own.
+        # https://developers.home-assistant.io/docs/entity_registry_index
+        self._attr_unique_id = coordinator.get_serial_number()
+        # https://developers.home-assistant.io/docs/device_registry_index
+        self._attr_device_info = {
+            "identifiers": {(DOMAIN, coordinator.get_serial_number())},
+            "name": coordinator.get_device_name(),
+            "model": coordinator.get_model(),
             "manufacturer": "Dahua",
-            "configuration_url": "http://" + self._coordinator.get_address(),
-            "sw_version": self._coordinator.get_firmware_version(),
+            "configuration_url": "http://" + coordinator.get_address(),
+            "sw_version": coordinator.get_firmware_version(),
         }
+        # Home Assistant copies the attributes into the state, so we can hand back the same dict until the id changes
+        self._state_attributes = None
 
     @property
     def extra_state_attributes(self):
         """Return the state attributes."""
-        return {
-            "id": str(self.coordinator.data.get("id")),
-            "integration": DOMAIN,
-        }
+        device_id = str(self.coordinator.data.get("id"))
+        if self._state_attributes is None or self._state_attributes["id"] != device_id:
+            self._state_attributes = {
+                "id": device_id,
+                "integration": DOMAIN,
+            }
+        return self._state_attributes
+
+    async def _call_and_refresh(self, *calls):
+        """
+        Awaits the given device calls in order and then asks the coordinator for a refresh. async_request_refresh is
+        debounced so flipping a few switches quickly only polls the device once instead of once per switch
+        """
+        try:
+            for call in calls:
+                await call
+        finally:
+            # If one of the calls failed don't leave the ones after it un-awaited. Closing a finished one does nothing
+            for call in calls:
+                call.close()
+        await self.coordinator.async_request_refresh()
@@ -40,318 +40,178 @@ async def async_setup_entry(hass: HomeAssistant, entry, async_add_entities):
     async_add_entities(entities)
 
 
-class DahuaInfraredLight(DahuaBaseEntity, LightEntity):
-    """Representation of a Dahua infrared light (for cameras that have them)"""
+class DahuaLight(DahuaBaseEntity, LightEntity):
+    """
+    Base class for the lights below. Each light sets its unique id suffix and its fixed attributes (icon, color mode,
+    features) on the class so Home Assistant reads them directly instead of calling a property each time
+    """
+
+    _unique_id_suffix = ""
 
     def __init__(self, coordinator: DahuaDataUpdateCoordinator, entry, name):
         super().__init__(coordinator, entry)
-        self._name = name
-        self._coordinator = coordinator
+        self._attr_name = coordinator.get_device_name() + " " + name
+        # https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
+        self._attr_unique_id = coordinator.get_serial_number() + self._unique_id_suffix
 
-    @property
-    def name(self):
-        """Return the name of the light."""
-        return self._coordinator.get_device_name() + " " + self._name
 
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_infrared"
+class DahuaInfraredLight(DahuaLight):
+    """Representation of a Dahua infrared light (for cameras that have them)"""
+
+    _unique_id_suffix = "_infrared"
+    _attr_icon = INFRARED_ICON
+    _attr_color_mode = ColorMode.BRIGHTNESS
+    _attr_supported_color_modes = {ColorMode.BRIGHTNESS}
+    _attr_supported_features = LightEntityFeature.EFFECT
 
     @property
     def is_on(self):
         """Return true if the light is on"""
-        return self._coordinator.is_infrared_light_on()
+        return self.coordinator.is_infrared_light_on()
 
     @property
     def brightness(self):
         """Return the brightness of this light between 0..255 inclusive"""
-        return self._coordinator.get_infrared_brightness()
-
-    @property
-    def color_mode(self) -> ColorMode | str | None:
-        """Return the color mode of the light."""
-        return ColorMode.BRIGHTNESS
-
-    @property
-    def supported_color_modes(self) -> set[str]:
-        """Flag supported color modes."""
-        return {self.color_mode}
-
-    @property
-    def supported_features(self):
-        """Flag supported features."""
-        return LightEntityFeature.EFFECT
-
-    @property
-    def should_poll(self):
-        """Don't poll."""
-        return False
+        return self.coordinator.get_infrared_brightness()
 
     async def async_turn_on(self, **kwargs):
         """Turn the light on with the current brightness"""
         hass_brightness = kwargs.get(ATTR_BRIGHTNESS)
         dahua_brightness = dahua_utils.hass_brightness_to_dahua_brightness(hass_brightness)
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_lighting_v1(channel, True, dahua_brightness)
-        await self.coordinator.async_refresh()
+        await self._call_and_refresh(
+            self.coordinator.client.async_set_lighting_v1(self._channel, True, dahua_brightness),
+        )
 
     async def async_turn_off(self, **kwargs):
-        """Turn the light off"""
-        hass_brightness = kwargs.get(ATTR_BRIGHTNESS)
-        dahua_brightness = dahua_utils.hass_brightness_to_dahua_brightness(hass_brightness)
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_lighting_v1(channel, False, dahua_brightness)
-        await self.coordinator.async_refresh()
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return INFRARED_ICON
+        """Turn the light off. We don't send a brightness so the current one is kept for the next time it's on"""
+        await self._call_and_refresh(self.coordinator.client.async_set_lighting_v1(self._channel, False))
 
 
-class DahuaIlluminator(DahuaBaseEntity, LightEntity):
+class DahuaIlluminator(DahuaLight):
     """Representation of a Dahua light (for cameras that have them)"""
 
-    def __init__(self, coordinator: DahuaDataUpdateCoordinator, entry, name):
-        super().__init__(coordinator, entry)
-        self._name = name
-        self._coordinator = coordinator
-
-    @property
-    def name(self):
-        """Return the name of the light."""
-        return self._coordinator.get_device_name() + " " + self._name
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_illuminator"
+    _unique_id_suffix = "_illuminator"
+    _attr_color_mode = ColorMode.BRIGHTNESS
+    _attr_supported_features = 0
 
     @property
     def is_on(self):
         """Return true if the light is on"""
-        return self._coordinator.is_illuminator_on()
+        return self.coordinator.is_illuminator_on()
 
     @property
     def brightness(self):
         """Return the brightness of this light between 0..255 inclusive"""
 
-        return self._coordinator.get_illuminator_brightness()
-
-    @property
-    def color_mode(self) -> ColorMode | str | None:
-        """Return the color mode of the light."""
-        return ColorMode.BRIGHTNESS
-
-    @property
-    def supported_features(self):
-        """Flag supported features."""
-        return 0
-
-    @property
-    def should_poll(self):
-        """Don't poll."""
-        return False
+        return self.coordinator.get_illuminator_brightness()
 
     async def async_turn_on(self, **kwargs):
         """Turn the light on with the current brightness"""
         hass_brightness = kwargs.get(ATTR_BRIGHTNESS)
         dahua_brightness = dahua_utils.hass_brightness_to_dahua_brightness(hass_brightness)
-        channel = self._coordinator.get_channel()
-        profile_mode = self._coordinator.get_profile_mode()
-        await self._coordinator.client.async_set_lighting_v2(channel, True, dahua_brightness, profile_mode)
-        await self._coordinator.async_refresh()
+        profile_mode = self.coordinator.get_profile_mode()
+        await self._call_and_refresh(
+            self.coordinator.client.async_set_lighting_v2(self._channel, True, dahua_brightness, profile_mode),
+        )
 
     async def async_turn_off(self, **kwargs):
-        """Turn the light off"""
-        hass_brightness = kwargs.get(ATTR_BRIGHTNESS)
-        dahua_brightness = dahua_utils.hass_brightness_to_dahua_brightness(hass_brightness)
-        channel = self._coordinator.get_channel()
-        profile_mode = self._coordinator.get_profile_mode()
-        await self._coordinator.client.async_set_lighting_v2(channel, False, dahua_brightness, profile_mode)
-        await self._coordinator.async_refresh()
+        """Turn the light off. We don't send a brightness so the current one is kept for the next time it's on"""
+        profile_mode = self.coordinator.get_profile_mode()
+        await self._call_and_refresh(
+            self.coordinator.client.async_set_lighting_v2(self._channel, False, None, profile_mode),
+        )
 
 
-class AmcrestRingLight(DahuaBaseEntity, LightEntity):
+class AmcrestRingLight(DahuaLight):
     """Representation of a Amcrest ring light"""
 
-    def __init__(self, coordinator: DahuaDataUpdateCoordinator, entry, name):
-        super().__init__(coordinator, entry)
-        self._name = name
-        self._coordinator = coordinator
-
-    @property
-    def name(self):
-        """Return the name of the light."""
-        return self._coordinator.get_device_name() + " " + self._name
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue).
-        Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_ring_light"
+    _unique_id_suffix = "_ring_light"
+    _attr_color_mode = ColorMode.ONOFF
+    _attr_supported_color_modes = {ColorMode.ONOFF}
 
     @property
     def is_on(self):
         """Return true if the light is on"""
-        return self._coordinator.is_ring_light_on()
+        return self.coordinator.is_ring_light_on()
 
     async def async_turn_on(self, **kwargs):
         """Turn the light on"""
-        await self._coordinator.client.async_set_light_global_enabled(True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(self.coordinator.client.async_set_light_global_enabled(True))
 
     async def async_turn_off(self, **kwargs):
         """Turn the light off"""
-        await self._coordinator.client.async_set_light_global_enabled(False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def color_mode(self) -> ColorMode | str | None:
-        """Return the color mode of the light."""
-        return ColorMode.ONOFF
-
-    @property
-    def supported_color_modes(self) -> set[str]:
-        """Flag supported color modes."""
-        return {self.color_mode}
+        await self._call_and_refresh(self.coordinator.client.async_set_light_global_enabled(False))
 
 
-class FloodLight(DahuaBaseEntity, LightEntity):
+class FloodLight(DahuaLight):
     """
         Representation of a Amcrest, Dahua, and Lorex Flood Light (for cameras that have them)
         Unlike the 'Dahua Illuminator', Amcrest Flood Lights do not play nicely
         with adjusting the 'White Light' brightness.
     """
 
-    def __init__(self, coordinator: DahuaDataUpdateCoordinator, entry, name):
-        super().__init__(coordinator, entry)
-        self._name = name
-        self._coordinator = coordinator
-
-    @property
-    def name(self):
-        """Return the name of the light."""
-        return self._coordinator.get_device_name() + " " + self._name
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_flood_light"
+    _unique_id_suffix = "_flood_light"
+    _attr_supported_features = LightEntityFeature.EFFECT
 
     @property
     def is_on(self):
         """Return true if the light is on"""
-        return self._coordinator.is_flood_light_on()
-
-    @property
-    def supported_features(self):
-        """Flag supported features."""
-        return LightEntityFeature.EFFECT
-
-    @property
-    def should_poll(self):
-        """Don't poll."""
-        return False
+        return self.coordinator.is_flood_light_on()
 
     async def async_turn_on(self, **kwargs):
         """Turn the light on"""
-        if self._coordinator._supports_floodlightmode:
-            channel = self._coordinator.get_channel()
-            self._coordinator._floodlight_mode = await self._coordinator.client.async_get_floodlightmode()
-            await self._coordinator.client.async_set_floodlightmode(2)
-            await self._coordinator.client.async_set_coaxial_control_state(channel, SECURITY_LIGHT_TYPE, True)
-            await self._coordinator.async_refresh()
+        if self.coordinator._supports_floodlightmode:
+            self.coordinator._floodlight_mode = await self.coordinator.client.async_get_floodlightmode()
+            await self._call_and_refresh(
+                self.coordinator.client.async_set_floodlightmode(2),
+                self.coordinator.client.async_set_coaxial_control_state(self._channel, SECURITY_LIGHT_TYPE, True),
+            )
         else:
-            channel = self._coordinator.get_channel()
-            profile_mode = self._coordinator.get_profile_mode()
-            await self._coordinator.client.async_set_lighting_v2_for_flood_lights(channel, True, profile_mode)
-            await self._coordinator.async_refresh()
+            profile_mode = self.coordinator.get_profile_mode()
+            await self._call_and_refresh(
+                self.coordinator.client.async_set_lighting_v2_for_flood_lights(self._channel, True, profile_mode),
+            )
 
     async def async_turn_off(self, **kwargs):
         """Turn the light off"""
-        if self._coordinator._supports_floodlightmode:
-            channel = self._coordinator.get_channel()
-            await self._coordinator.client.async_set_coaxial_control_state(channel, SECURITY_LIGHT_TYPE, False)
-            await self._coordinator.client.async_set_floodlightmode(self._coordinator._floodlight_mode)
-            await self._coordinator.async_refresh()
+        if self.coordinator._supports_floodlightmode:
+            await self._call_and_refresh(
+                self.coordinator.client.async_set_coaxial_control_state(self._channel, SECURITY_LIGHT_TYPE, False),
+                self.coordinator.client.async_set_floodlightmode(self.coordinator._floodlight_mode),
+            )
         else:
-            channel = self._coordinator.get_channel()
-            profile_mode = self._coordinator.get_profile_mode()
-            await self._coordinator.client.async_set_lighting_v2_for_flood_lights(channel, False, profile_mode)
-            await self._coordinator.async_refresh()
+            profile_mode = self.coordinator.get_profile_mode()
+            await self._call_and_refresh(
+                self.coordinator.client.async_set_lighting_v2_for_flood_lights(self._channel, False, profile_mode),
+            )
 
 
-class DahuaSecurityLight(DahuaBaseEntity, LightEntity):
+class DahuaSecurityLight(DahuaLight):
     """
     Representation of a Dahua light (for cameras that have them). This is the red/blue flashing lights.
     The camera will only keep this light on for a few seconds before it automatically turns off.
     """
 
-    def __init__(self, coordinator: DahuaDataUpdateCoordinator, entry, name):
-        super().__init__(coordinator, entry)
-        self._name = name
-        self._coordinator = coordinator
-
-    @property
-    def name(self):
-        """Return the name of the light."""
-        return self._coordinator.get_device_name() + " " + self._name
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_security"
+    _unique_id_suffix = "_security"
+    _attr_icon = SECURITY_LIGHT_ICON
+    # Most people don't use this so it starts out disabled, it can be enabled from the entity settings
+    _attr_entity_registry_enabled_default = False
+    _attr_color_mode = ColorMode.ONOFF
+    _attr_supported_color_modes = {ColorMode.ONOFF}
 
     @property
     def is_on(self):
         """Return true if the light is on"""
-        return self._coordinator.is_security_light_on()
-
-    @property
-    def should_poll(self):
-        """Don't poll."""
-        return False
+        return self.coordinator.is_security_light_on()
 
     async def async_turn_on(self, **kwargs):
         """Turn the light on"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_coaxial_control_state(channel, SECURITY_LIGHT_TYPE, True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(
+            self.coordinator.client.async_set_coaxial_control_state(self._channel, SECURITY_LIGHT_TYPE, True),
+        )
 
     async def async_turn_off(self, **kwargs):
         """Turn the light off"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_coaxial_control_state(channel, SECURITY_LIGHT_TYPE, False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return SECURITY_LIGHT_ICON
-
-    @property
-    def color_mode(self) -> ColorMode | str | None:
-        """Return the color mode of the light."""
-        return ColorMode.ONOFF
-
-    @property
-    def supported_color_modes(self) -> set[str]:
-        """Flag supported color modes."""
-        return {self.color_mode}
+        await self._call_and_refresh(
+            self.coordinator.client.async_set_coaxial_control_state(self._channel, SECURITY_LIGHT_TYPE, False),
+        )
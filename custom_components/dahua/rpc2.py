@@ -3,19 +3,24 @@ Dahua RPC2 API Client
 
 Auth taken and modified and added to, from https://gist.github.com/gxfxyz/48072a72be3a169bc43549e676713201
 """
+import asyncio
 import hashlib
-import json
+import itertools
 import logging
-import sys
 
 import aiohttp
 
+# orjson ships with Home Assistant and is a lot faster than the json module. Fall back just in case it's missing
+try:
+    from orjson import dumps as json_dumps, loads as json_loads
+except ImportError:
+    from json import dumps as json_dumps, loads as json_loads
+
 from custom_components.dahua.models import CoaxialControlIOStatus
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
-if sys.version_info > (3, 0):
-    unicode = str
+LOGOUT_TIMEOUT_SECONDS = 2
 
 
 class DahuaRpc2Client:
@@ -33,14 +38,25 @@ class DahuaRpc2Client:
         self._session = session
         self._rtsp_port = rtsp_port
         self._session_id = None
-        self._id = 0
+        # count's __next__ hands out ids atomically so concurrent requests never share one
+        self._next_id = itertools.count(1).__next__
         protocol = "https" if int(port) == 443 else "http"
-        self._base = "{0}://{1}:{2}".format(protocol, address, port)
+        self._base = f"{protocol}://{address}:{port}"
+        # These never change so build them once
+        self._rpc_url = f"{self._base}/RPC2"
+        self._login_url = f"{self._base}/RPC2_Login"
+        # The first login step only depends on the username. It's never changed so we can send the same dict each time
+        self._login_params = {'userName': self._username,
+                              'password': "",
+                              'clientType': "Dahua3.0-Web3.0"}
+        # The machine name is rarely changed so we only ask for it once
+        self._device_name = None
+        # The password hash only depends on the username, realm, and password so we only need to hash it once per realm
+        self._pwd_hash_by_realm = {}
 
     async def request(self, method, params=None, object_id=None, extra=None, url=None, verify_result=True):
         """Make an RPC request."""
-        self._id += 1
-        data = {'method': method, 'id': self._id}
+        data = {'method': method, 'id': self._next_id()}
         if params is not None:
             data['params'] = params
         if object_id:
@@ -49,11 +65,10 @@ class DahuaRpc2Client:
             data.update(extra)
         if self._session_id:
             data['session'] = self._session_id
-        if not url:
-            url = "{0}/RPC2".format(self._base)
 
-        resp = await self._session.post(url, data=json.dumps(data))
-        resp_json = json.loads(await resp.text())
+        resp = await self._session.post(url or self._rpc_url, data=json_dumps(data))
+        # Devices don't always send a json content type so don't check it
+        resp_json = await resp.json(loads=json_loads, content_type=None)
 
         if verify_result and resp_json['result'] is False:
             raise ConnectionError(str(resp))
@@ -69,27 +84,24 @@ class DahuaRpc2Client:
 
         # login1: get session, realm & random for real login
         self._session_id = None
-        self._id = 0
-        url = '{0}/RPC2_Login'.format(self._base)
+        self._next_id = itertools.count(1).__next__
+        url = self._login_url
         method = "global.login"
-        params = {'userName': self._username,
-                  'password': "",
-                  'clientType': "Dahua3.0-Web3.0"}
-        r = await self.request(method=method, params=params, url=url, verify_result=False)
+        r = await self.request(method=method, params=self._login_params, url=url, verify_result=False)
 
         self._session_id = r['session']
         realm = r['params']['realm']
         random = r['params']['random']
 
         # Password encryption algorithm. Reversed from rpcCore.getAuthByType
-        pwd_phrase = self._username + ":" + realm + ":" + self._password
-        if isinstance(pwd_phrase, unicode):
-            pwd_phrase = pwd_phrase.encode('utf-8')
-        pwd_hash = hashlib.md5(pwd_phrase).hexdigest().upper()
-        pass_phrase = self._username + ':' + random + ':' + pwd_hash
-        if isinstance(pass_phrase, unicode):
-            pass_phrase = pass_phrase.encode('utf-8')
-        pass_hash = hashlib.md5(pass_phrase).hexdigest().upper()
+        # MD5 is what the device wants here, it's not protecting anything on our side so mark it as such
+        pwd_hash = self._pwd_hash_by_realm.get(realm)
+        if pwd_hash is None:
+            pwd_phrase = (self._username + ":" + realm + ":" + self._password).encode('utf-8')
+            pwd_hash = hashlib.md5(pwd_phrase, usedforsecurity=False).hexdigest().upper()
+            self._pwd_hash_by_realm[realm] = pwd_hash
+        pass_phrase = (self._username + ':' + random + ':' + pwd_hash).encode('utf-8')
+        pass_hash = hashlib.md5(pass_phrase, usedforsecurity=False).hexdigest().upper()
 
         # login2: the real login
         params = {'userName': self._username,
@@ -101,14 +113,20 @@ class DahuaRpc2Client:
 
     async def logout(self) -> bool:
         """Logs out of the current session. Returns true if the logout was successful"""
+        if not self._session_id:
+            # Never logged in, nothing to do
+            return True
         try:
-            response = await self.request(method="global.logout")
+            # Don't let a device that stopped responding hold up whoever is logging out (like an unload)
+            response = await asyncio.wait_for(self.request(method="global.logout"), timeout=LOGOUT_TIMEOUT_SECONDS)
             if response['result'] is True:
                 return True
             else:
                 _LOGGER.debug("Failed to log out of Dahua device %s", self._base)
                 return False
-        except Exception as exception:
+        # request raises ConnectionError when the device says the call failed, ValueError when the body isn't json
+        # (like an HTML error page or nothing at all), and TypeError/KeyError when the json isn't the dict we expect
+        except (aiohttp.ClientError, asyncio.TimeoutError, ConnectionError, ValueError, TypeError, KeyError):
             return False
 
     async def current_time(self):
@@ -128,10 +146,13 @@ class DahuaRpc2Client:
 
     async def get_device_name(self) -> str:
         """Get the device name"""
-        data = await self.get_config({"name": "General"})
-        return data["table"]["MachineName"]
+        if self._device_name is None:
+            data = await self.get_config({"name": "General"})
+            self._device_name = data["table"]["MachineName"]
+        return self._device_name
 
     async def get_coaxial_control_io_status(self, channel: int) -> CoaxialControlIOStatus:
         """ async_get_coaxial_control_io_status returns the the current state of the speaker and white light. """
         response = await self.request(method="CoaxialControlIO.getStatus", params={"channel": channel})
-        return CoaxialControlIOStatus(response)
+        status = response["params"]["status"]
+        return CoaxialControlIOStatus(speaker=status["Speaker"] == "On", white_light=status["WhiteLight"] == "On")
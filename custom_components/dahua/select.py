@@ -10,6 +10,11 @@ from custom_components.dahua import DahuaDataUpdateCoordinator
 from .const import DOMAIN
 from .entity import DahuaBaseEntity
 
+# (Mode, State) of the doorbell's security light to the option we show. Anything else is Off
+_LIGHT_STATE_OPTION = {
+    ("ForceOn", "On"): "On",
+    ("ForceOn", "Flicker"): "Strobe",
+}
 
 async def async_setup_entry(hass: HomeAssistant, entry, async_add_devices):
     """Setup select platform."""
@@ -36,20 +41,12 @@ class DahuaDoorbellLightSelect(DahuaBaseEntity, SelectEntity):
 
     @property
     def current_option(self) -> str:
-        mode = self._coordinator.data.get("table.Lighting_V2[0][0][1].Mode", "")
-        state = self._coordinator.data.get("table.Lighting_V2[0][0][1].State", "")
-
-        if mode == "ForceOn" and state == "On":
-            return "On"
-
-        if mode == "ForceOn" and state == "Flicker":
-            return "Strobe"
-
-        return "Off"
+        data = self._coordinator.data
+        key = (data.get("table.Lighting_V2[0][0][1].Mode"), data.get("table.Lighting_V2[0][0][1].State"))
+        return _LIGHT_STATE_OPTION.get(key, "Off")
 
     async def async_select_option(self, option: str) -> None:
-        await self._coordinator.client.async_set_lighting_v2_for_amcrest_doorbells(option)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(self._coordinator.client.async_set_lighting_v2_for_amcrest_doorbells(option))
 
     @property
     def name(self):
@@ -34,38 +34,35 @@ async def async_setup_entry(hass: HomeAssistant, entry, async_add_devices):
     async_add_devices(devices)
 
 
-class DahuaMotionDetectionBinarySwitch(DahuaBaseEntity, SwitchEntity):
+class DahuaSwitch(DahuaBaseEntity, SwitchEntity):
+    """
+    Base class for the switches below. Each switch sets its name and unique id suffixes (and its icon) on the class
+    """
+
+    _name_suffix = ""
+    _unique_id_suffix = ""
+
+    def __init__(self, coordinator: DahuaDataUpdateCoordinator, config_entry):
+        super().__init__(coordinator, config_entry)
+        self._attr_name = coordinator.get_device_name() + self._name_suffix
+        # https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
+        self._attr_unique_id = coordinator.get_serial_number() + self._unique_id_suffix
+
+
+class DahuaMotionDetectionBinarySwitch(DahuaSwitch):
     """dahua motion detection switch class. Used to enable or disable motion detection"""
 
+    _name_suffix = " Motion Detection"
+    _unique_id_suffix = "_motion_detection"
+    _attr_icon = MOTION_DETECTION_ICON
+
     async def async_turn_on(self, **kwargs):  # pylint: disable=unused-argument
         """Turn on/enable motion detection."""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.enable_motion_detection(channel, True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(self._coordinator.client.enable_motion_detection(self._channel, True))
 
     async def async_turn_off(self, **kwargs):  # pylint: disable=unused-argument
         """Turn off/disable motion detection."""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.enable_motion_detection(channel, False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def name(self):
-        """Return the name of the switch."""
-        return self._coordinator.get_device_name() + " " + "Motion Detection"
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_motion_detection"
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return MOTION_DETECTION_ICON
+        await self._call_and_refresh(self._coordinator.client.enable_motion_detection(self._channel, False))
 
     @property
     def is_on(self):
@@ -76,39 +73,20 @@ class DahuaMotionDetectionBinarySwitch(DahuaBaseEntity, SwitchEntity):
         return self._coordinator.is_motion_detection_enabled()
 
 
-class DahuaDisarmingLinkageBinarySwitch(DahuaBaseEntity, SwitchEntity):
+class DahuaDisarmingLinkageBinarySwitch(DahuaSwitch):
     """will set the camera's disarming linkage (Event -> Disarming in the UI)"""
 
+    _name_suffix = " Disarming"
+    _unique_id_suffix = "_disarming"
+    _attr_icon = DISARMING_ICON
+
     async def async_turn_on(self, **kwargs):  # pylint: disable=unused-argument
         """Turn on/enable linkage"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_disarming_linkage(channel, True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(self._coordinator.client.async_set_disarming_linkage(self._channel, True))
 
     async def async_turn_off(self, **kwargs):  # pylint: disable=unused-argument
         """Turn off/disable linkage"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_disarming_linkage(channel, False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def name(self):
-        """Return the name of the switch."""
-        return self._coordinator.get_device_name() + " " + "Disarming"
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be
-        configurable by the user or be changeable see
-        https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_disarming"
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return DISARMING_ICON
+        await self._call_and_refresh(self._coordinator.client.async_set_disarming_linkage(self._channel, False))
 
     @property
     def is_on(self):
@@ -118,39 +96,20 @@ class DahuaDisarmingLinkageBinarySwitch(DahuaBaseEntity, SwitchEntity):
         """
         return self._coordinator.is_disarming_linkage_enabled()
 
-class DahuaDisarmingEventNotificationsLinkageBinarySwitch(DahuaBaseEntity, SwitchEntity):
+class DahuaDisarmingEventNotificationsLinkageBinarySwitch(DahuaSwitch):
     """will set the camera's event notifications when device is disarmed (Event -> Disarming -> Event Notifications in the UI)"""
 
+    _name_suffix = " Event Notifications"
+    _unique_id_suffix = "_event_notifications"
+    _attr_icon = BELL_ICON
+
     async def async_turn_on(self, **kwargs):  # pylint: disable=unused-argument
         """Turn on/enable event notifications"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_event_notifications(channel, True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(self._coordinator.client.async_set_event_notifications(self._channel, True))
 
     async def async_turn_off(self, **kwargs):  # pylint: disable=unused-argument
         """Turn off/disable event notifications"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_event_notifications(channel, False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def name(self):
-        """Return the name of the switch."""
-        return self._coordinator.get_device_name() + " " + "Event Notifications"
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be
-        configurable by the user or be changeable see
-        https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_event_notifications"
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return BELL_ICON
+        await self._call_and_refresh(self._coordinator.client.async_set_event_notifications(self._channel, False))
 
     @property
     def is_on(self):
@@ -159,43 +118,26 @@ class DahuaDisarmingEventNotificationsLinkageBinarySwitch(DahuaBaseEntity, Switc
         """
         return self._coordinator.is_event_notifications_enabled()
 
-class DahuaSmartMotionDetectionBinarySwitch(DahuaBaseEntity, SwitchEntity):
+class DahuaSmartMotionDetectionBinarySwitch(DahuaSwitch):
     """Enables or disables the Smart Motion Detection option in the camera"""
 
+    _name_suffix = " Smart Motion Detection"
+    _unique_id_suffix = "_smart_motion_detection"
+    _attr_icon = MOTION_DETECTION_ICON
+
     async def async_turn_on(self, **kwargs):  # pylint: disable=unused-argument
         """Turn on SmartMotionDetect"""
         if self._coordinator.supports_smart_motion_detection_amcrest():
-            await self._coordinator.client.async_set_ivs_rule(0, 0, True)
+            await self._call_and_refresh(self._coordinator.client.async_set_ivs_rule(0, 0, True))
         else:
-            await self._coordinator.client.async_enabled_smart_motion_detection(True)
-        await self._coordinator.async_refresh()
+            await self._call_and_refresh(self._coordinator.client.async_enabled_smart_motion_detection(True))
 
     async def async_turn_off(self, **kwargs):  # pylint: disable=unused-argument
         """Turn off SmartMotionDetect"""
         if self._coordinator.supports_smart_motion_detection_amcrest():
-            await self._coordinator.client.async_set_ivs_rule(0, 0, False)
+            await self._call_and_refresh(self._coordinator.client.async_set_ivs_rule(0, 0, False))
         else:
-            await self._coordinator.client.async_enabled_smart_motion_detection(False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def name(self):
-        """Return the name of the switch."""
-        return self._coordinator.get_device_name() + " " + "Smart Motion Detection"
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be
-        configurable by the user or be changeable see
-        https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_smart_motion_detection"
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return MOTION_DETECTION_ICON
+            await self._call_and_refresh(self._coordinator.client.async_enabled_smart_motion_detection(False))
 
     @property
     def is_on(self):
@@ -203,38 +145,24 @@ class DahuaSmartMotionDetectionBinarySwitch(DahuaBaseEntity, SwitchEntity):
         return self._coordinator.is_smart_motion_detection_enabled()
 
 
-class DahuaSirenBinarySwitch(DahuaBaseEntity, SwitchEntity):
+class DahuaSirenBinarySwitch(DahuaSwitch):
     """dahua siren switch class. Used to enable or disable camera built in sirens"""
 
+    _name_suffix = " Siren"
+    _unique_id_suffix = "_siren"
+    _attr_icon = SIREN_ICON
+
     async def async_turn_on(self, **kwargs):  # pylint: disable=unused-argument
         """Turn on/enable the camera's siren"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_coaxial_control_state(channel, SIREN_TYPE, True)
-        await self._coordinator.async_refresh()
+        await self._call_and_refresh(
+            self._coordinator.client.async_set_coaxial_control_state(self._channel, SIREN_TYPE, True),
+        )
 
     async def async_turn_off(self, **kwargs):  # pylint: disable=unused-argument
         """Turn off/disable camera siren"""
-        channel = self._coordinator.get_channel()
-        await self._coordinator.client.async_set_coaxial_control_state(channel, SIREN_TYPE, False)
-        await self._coordinator.async_refresh()
-
-    @property
-    def name(self):
-        """Return the name of the switch."""
-        return self._coordinator.get_device_name() + " Siren"
-
-    @property
-    def unique_id(self):
-        """
-        A unique identifier for this entity. Needs to be unique within a platform (ie light.hue). Should not be configurable by the user or be changeable
-        see https://developers.home-assistant.io/docs/entity_registry_index/#unique-id-requirements
-        """
-        return self._coordinator.get_serial_number() + "_siren"
-
-    @property
-    def icon(self):
-        """Return the icon of this switch."""
-        return SIREN_ICON
+        await self._call_and_refresh(
+            self._coordinator.client.async_set_coaxial_control_state(self._channel, SIREN_TYPE, False),
+        )
 
     @property
     def is_on(self):
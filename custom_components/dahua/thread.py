@@ -1,10 +1,7 @@
-""" Dahua Thread """
+""" Dahua event stream tasks """
 
 import asyncio
-import sys
-import threading
 import logging
-import time
 
 from homeassistant.core import HomeAssistant
 from custom_components.dahua.client import DahuaClient
@@ -13,133 +10,108 @@ from custom_components.dahua.vto import DahuaVTOClient
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
 
-class DahuaEventThread(threading.Thread):
-    """Connects to device and subscribes to events. Mainly to capture motion detection events. """
+class DahuaEventTask:
+    """
+    Connects to device and subscribes to events. Mainly to capture motion detection events. The stream is read on the
+    HA event loop so this runs as a task there instead of in its own thread.
+    """
+
+    # One of these is made per camera, slots keep the instances small
+    __slots__ = ("hass", "on_receive", "client", "events", "channel", "_task")
 
     def __init__(self, hass: HomeAssistant, client: DahuaClient, on_receive, events: list, channel: int):
-        """Construct a thread listening for events."""
-        threading.Thread.__init__(self)
+        """Construct a task listening for events."""
         self.hass = hass
-        self.stopped = threading.Event()
         self.on_receive = on_receive
         self.client = client
         self.events = events
-        self.started = False
         self.channel = channel
-
-    def run(self):
-        """Fetch events"""
-        self.started = True
-        _LOGGER.info("Starting DahuaEventThread")
-
-        while True:
-            if not self.started:
-                _LOGGER.debug("Exiting DahuaEventThread")
-                return
-            # submit the coroutine to the event loop thread
-            coro = self.client.stream_events(self.on_receive, self.events, self.channel)
-            future = asyncio.run_coroutine_threadsafe(coro, self.hass.loop)
-            start_time = int(time.time())
-
-            try:
-                # wait for the coroutine to finish
-                future.result()
-            except asyncio.TimeoutError as ex:
-                _LOGGER.warning("TimeoutError connecting to camera")
-                future.cancel()
-            except Exception as ex:  # pylint: disable=broad-except
-                _LOGGER.debug("%s", ex)
-
-            if not self.started:
-                _LOGGER.debug("Exiting DahuaEventThread")
-                return
-
-            end_time = int(time.time())
-            if (end_time - start_time) < 10:
-                # We are failing fast when trying to connect to the camera. Let's retry slowly
-                time.sleep(60)
-
-            _LOGGER.debug("reconnecting to camera's event stream...")
+        self._task = None
+
+    def start(self):
+        """Starts listening for events. Must be called from the event loop"""
+        if self._task is None:
+            _LOGGER.info("Starting DahuaEventTask")
+            self._task = self.hass.async_create_background_task(self._run(), name="dahua event stream")
+
+    async def _run(self):
+        """
+        Fetch events. stream_events reconnects with a backoff on its own and only returns once the session is closed (we
+        are unloading) or there are no credentials, so there's nothing to retry here
+        """
+        try:
+            await self.client.stream_events(self.on_receive, self.events, self.channel)
+        except Exception as ex:  # pylint: disable=broad-except
+            _LOGGER.error("Event stream stopped unexpectedly: %s", ex)
+        _LOGGER.debug("DahuaEventTask finished")
 
     def stop(self):
-        """ Signals to the thread loop that we should stop """
-        if self.started:
-            _LOGGER.info("Stopping DahuaEventThread")
-            self.stopped.set()
-            self.started = False
+        """ Stops listening for events by cancelling the task """
+        if self._task is not None:
+            _LOGGER.info("Stopping DahuaEventTask")
+            self._task.cancel()
+            self._task = None
+
 
+class DahuaVtoEventTask:
+    """
+    Connects to a VTO device (Dahua doorbell) and subscribes to events. This runs as a task on the HA event loop so the
+    VTO client and the HA entities that use it all live on the same loop.
+    """
 
-class DahuaVtoEventThread(threading.Thread):
-    """Connects to device and subscribes to events. Mainly to capture motion detection events. """
+    __slots__ = ("hass", "on_receive_vto_event", "client", "_host", "_port", "_username", "_password", "_is_ssl",
+                 "vto_client", "_task")
 
     def __init__(self, hass: HomeAssistant, client: DahuaClient, on_receive_vto_event, host: str,
                  port: int, username: str, password: str):
-        """Construct a thread listening for events."""
-        threading.Thread.__init__(self)
+        """Construct a task listening for events."""
         self.hass = hass
-        self.stopped = threading.Event()
         self.on_receive_vto_event = on_receive_vto_event
         self.client = client
-        self.started = False
         self._host = host
         self._port = port
         self._username = username
         self._password = password
         self._is_ssl = False
         self.vto_client = None
+        self._task = None
 
-    def run(self):
-        """Fetch VTO events"""
-        self.started = True
-        _LOGGER.info("Starting DahuaVtoEventThread")
+    def start(self):
+        """Starts listening for VTO events. Must be called from the event loop"""
+        if self._task is None:
+            _LOGGER.info("Starting DahuaVtoEventTask")
+            self._task = self.hass.async_create_background_task(self._run(), name="dahua vto event stream")
+
+    def _create_vto_client(self) -> DahuaVTOClient:
+        return DahuaVTOClient(self._host, self._username, self._password, self._is_ssl, self.on_receive_vto_event)
 
+    async def _run(self):
+        """Fetch VTO events"""
+        loop = asyncio.get_running_loop()
         while True:
             try:
-                if not self.started:
-                    _LOGGER.debug("Exiting DahuaVtoEventThread")
-                    return
-
                 _LOGGER.debug("Connecting to VTO event stream")
 
-                # TODO: How do I integrate this in with the HA loop? Does it even matter? I think so because
-                # how well do we know when we are shutting down HA?
-                loop = asyncio.new_event_loop()
-
-                def vto_client_lambda():
-                    # Notice how we set vto_client client here. This is so nasty, I'm embarrassed to put this into the
-                    # code, but I'm not a python expert and it works well enough and this is just a spare time project
-                    # so here it is. We need to capture an instance of the DahuaVTOClient so we can use it later on
-                    # in switches to execute commands on the VTO. We need the client connected to the event loop
-                    # which is done through loop.create_connection. This makes it awkward to capture... which is why
-                    # I've done this. I'm sure there's a better way :)
-                    self.vto_client = DahuaVTOClient(self._host, self._username, self._password, self._is_ssl,
-                                                     self.on_receive_vto_event)
-                    return self.vto_client
-
-                client = loop.create_connection(vto_client_lambda, host=self._host, port=self._port)
-
-                loop.run_until_complete(client)
-                loop.run_forever()
-                loop.close()
+                # create_connection hands back the protocol it made, which is the client we use later on in
+                # switches to execute commands on the VTO
+                _, self.vto_client = await loop.create_connection(self._create_vto_client, host=self._host,
+                                                                  port=self._port)
+                await self.vto_client.closed
 
                 _LOGGER.warning("Disconnected from VTO, will try to connect in 5 seconds")
+                await asyncio.sleep(5)
 
-                time.sleep(5)
-
-            except Exception as ex:
-                if not self.started:
-                    _LOGGER.debug("Exiting DahuaVtoEventThread")
-                    return
-                exc_type, exc_obj, exc_tb = sys.exc_info()
-                line = exc_tb.tb_lineno
-
-                _LOGGER.error(f"Connection to VTO failed will try to connect in 30 seconds, error: {ex}, Line: {line}")
-
-                time.sleep(30)
+            except asyncio.CancelledError:
+                raise
+            except Exception as ex:  # pylint: disable=broad-except
+                _LOGGER.error("Connection to VTO failed will try to connect in 30 seconds, error: %s", ex)
+                await asyncio.sleep(30)
 
     def stop(self):
-        """ Signals to the thread loop that we should stop """
-        if self.started:
-            _LOGGER.info("Stopping DahuaVtoEventThread")
-            self.stopped.set()
-            self.started = False
+        """ Stops listening for VTO events by cancelling the task and closing the connection """
+        if self._task is not None:
+            _LOGGER.info("Stopping DahuaVtoEventTask")
+            self._task.cancel()
+            self._task = None
+        if self.vto_client is not None and self.vto_client.transport is not None:
+            self.vto_client.transport.close()
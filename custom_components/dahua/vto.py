@@ -3,20 +3,22 @@ Copied and modified from https://github.com/elad-bar/DahuaVTO2MQTT
 Thanks to @elad-bar
 """
 import struct
-import sys
 import logging
 import json
 import asyncio
 import hashlib
+import itertools
 from json import JSONDecoder
-from threading import Timer
 from typing import Optional, Callable
-from requests.auth import HTTPDigestAuth
 
-PROTOCOLS = {
-    True: "https",
-    False: "http"
-}
+# orjson ships with Home Assistant and writes compact bytes straight away. Fall back to the json module just in case
+try:
+    from orjson import dumps as json_dumps_bytes, loads as json_loads
+except ImportError:
+    from json import loads as json_loads
+
+    def json_dumps_bytes(data) -> bytes:
+        return json.dumps(data, separators=(",", ":")).encode("utf-8")
 
 _LOGGER: logging.Logger = logging.getLogger(__package__)
 
@@ -32,51 +34,85 @@ DAHUA_CONFIG_MANAGER_GETCONFIG = "configManager.getConfig"
 DAHUA_MAGICBOX_GETSOFTWAREVERSION = "magicBox.getSoftwareVersion"
 DAHUA_MAGICBOX_GETDEVICETYPE = "magicBox.getDeviceType"
 
-DAHUA_ALLOWED_DETAILS = [
+# Params that are the same for every connection. They're only serialized, never changed, so they're built once here
+PRE_LOGIN_PARAMS = {
+    "clientType": "",
+    "ipAddr": "(null)",
+    "loginType": "Direct",
+    "password": ""
+}
+LOGIN_PARAMS = {
+    "clientType": "",
+    "ipAddr": "(null)",
+    "loginType": "Direct",
+    "authorityType": "Default"
+}
+ATTACH_EVENT_MANAGER_PARAMS = {"codes": ['All']}
+ACCESS_CONTROL_CONFIG_PARAMS = {"name": "AccessControl"}
+SERIAL_NUMBER_CONFIG_PARAMS = {"name": "T2UServer"}
+
+DAHUA_ALLOWED_DETAILS = frozenset((
     DAHUA_DEVICE_TYPE,
     DAHUA_SERIAL_NUMBER
-]
+))
+
+# The 32 byte DHIP header sent in front of every message. The first half is big endian and the lengths are little
+# endian, struct only takes one byte order per format so it's split in two. Compiled once instead of packing each field
+DHIP_HEADER_START = struct.Struct(">LLd")
+DHIP_HEADER_LENGTHS = struct.Struct("<LLLL")
+DHIP_HEADER_SIZE = DHIP_HEADER_START.size + DHIP_HEADER_LENGTHS.size
+# Every header has this at bytes 4-8, and the little endian body length at bytes 16-20
+DHIP_MAGIC = b"DHIP"
+DHIP_BODY_LENGTH = struct.Struct("<L")
+# If a header claims a body bigger than this it's garbage, skip it instead of buffering forever
+MAX_DHIP_BODY_BYTES = 1024 * 1024
 
 
 class DahuaVTOClient(asyncio.Protocol):
-    requestId: int
     sessionId: int
     keep_alive_interval: int
     username: str
     password: str
     realm: Optional[str]
     random: Optional[str]
-    messages: []
-    dahua_details: {}
-    base_url: str
+    dahua_details: dict
     hold_time: int
-    lock_status: {}
-    auth: HTTPDigestAuth
-    data_handlers: {}
+    lock_status: dict
+    data_handlers: dict
+    stream_handlers: dict
     buffer: bytearray
 
     def __init__(self, host: str, username: str, password: str, is_ssl: bool, on_receive_vto_event):
         self.dahua_details = {}
+        # The details from dahua_details that are added to every event
+        self._event_details = {}
         self.host = host
         self.username = username
         self.password = password
         self.is_ssl = is_ssl
-        self.base_url = f"{PROTOCOLS[self.is_ssl]}://{self.host}/cgi-bin/"
-        self.auth = HTTPDigestAuth(self.username, self.password)
         self.realm = None
         self.random = None
-        self.request_id = 1
+        self._password_hash_by_realm = {}
+        # The first message goes out with id 2, like it always has
+        self._next_request_id = itertools.count(2).__next__
         self.sessionId = 0
         self.keep_alive_interval = 0
         self.transport = None
         self.hold_time = 0
         self.lock_status = {}
         self.data_handlers = {}
+        self.stream_handlers = {}
         self.buffer = bytearray()
 
         # This is the hook back into HA
         self.on_receive_vto_event = on_receive_vto_event
         self._loop = asyncio.get_event_loop()
+        # Done when the connection goes away so whoever connected us knows when to reconnect
+        self.closed = self._loop.create_future()
+        self._keep_alive_handle = None
+        self._keep_alive_params = None
+        # Set to a list while send_batch is collecting requests
+        self._pending_writes = None
 
     def connection_made(self, transport):
         _LOGGER.debug("VTO connection established")
@@ -85,22 +121,16 @@ class DahuaVTOClient(asyncio.Protocol):
             self.transport = transport
             self.pre_login()
 
-        except Exception as ex:
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-
-            _LOGGER.error(f"Failed to handle message, error: {ex}, Line: {exc_tb.tb_lineno}")
+        except Exception:
+            _LOGGER.exception("Failed to handle message")
 
     def data_received(self, data):
-        _LOGGER.debug(f"Event data {self.host}: '{data}'")
+        # Every read goes through here, so let logging format the bytes only when debug logging is on
+        _LOGGER.debug("Event data %s: '%s'", self.host, data)
 
         self.buffer += data
 
-        while b'\n' in self.buffer:
-
-            newline_index = self.buffer.find(b'\n') + 1
-            packet = self.buffer[:newline_index]
-            self.buffer = self.buffer[newline_index:]
-
+        for packet in self._pop_frames():
             try:
                 messages = self.parse_response(packet)
                 for message in messages:
@@ -109,12 +139,14 @@ class DahuaVTOClient(asyncio.Protocol):
 
                     message_id = message.get("id")
 
-                    handler: Callable = self.data_handlers.get(message_id, self.handle_default)
+                    # Replies are one shot so drop their handler once it's used, otherwise they'd pile up for as long as
+                    # we stay connected. Event stream notifications keep coming with the attach request's id
+                    handler: Callable = self.data_handlers.pop(message_id, None)
+                    if handler is None:
+                        handler = self.stream_handlers.get(message_id, self.handle_default)
                     handler(message)
-            except Exception as ex:
-                exc_type, exc_obj, exc_tb = sys.exc_info()
-
-                _LOGGER.error(f"Failed to handle message, error: {ex}, Line: {exc_tb.tb_lineno}")
+            except Exception:
+                _LOGGER.exception("Failed to handle message")
 
     def handle_notify_event_stream(self, params):
         try:
@@ -123,66 +155,92 @@ class DahuaVTOClient(asyncio.Protocol):
             event_list = params.get("eventList")
 
             for message in event_list:
-                for k in self.dahua_details:
-                    if k in DAHUA_ALLOWED_DETAILS:
-                        message[k] = self.dahua_details.get(k)
+                message.update(self._event_details)
 
                 self.on_receive_vto_event(message)
 
-        except Exception as ex:
-            exc_type, exc_obj, exc_tb = sys.exc_info()
+        except Exception:
+            _LOGGER.exception("Failed to handle event")
 
-            _LOGGER.error(f"Failed to handle event, error: {ex}, Line: {exc_tb.tb_lineno}")
+    def _set_detail(self, key, value):
+        """ Saves a device detail, and keeps the details we add to each event up to date so we don't filter per event """
+        self.dahua_details[key] = value
+        if key in DAHUA_ALLOWED_DETAILS:
+            self._event_details[key] = value
 
     def handle_default(self, message):
-        _LOGGER.info(f"Data received without handler: {message}")
+        _LOGGER.info("Data received without handler: %s", message)
 
     def eof_received(self):
         _LOGGER.info('Server sent EOF message')
 
-        self._loop.stop()
+        self._set_closed()
 
     def connection_lost(self, exc):
         _LOGGER.error('server closed the connection')
 
-        self._loop.stop()
+        self._set_closed()
 
-    def send(self, action, handler, params=None):
+    def _set_closed(self):
+        if self._keep_alive_handle is not None:
+            self._keep_alive_handle.cancel()
+            self._keep_alive_handle = None
+        if not self.closed.done():
+            self.closed.set_result(None)
+
+    def send(self, action, handler, params=None, stream=False):
         if params is None:
             params = {}
 
-        self.request_id += 1
+        request_id = self._next_request_id()
 
         message_data = {
-            "id": self.request_id,
+            "id": request_id,
             "session": self.sessionId,
             "magic": "0x1234",
             "method": action,
             "params": params
         }
 
-        self.data_handlers[self.request_id] = handler
+        if stream:
+            self.stream_handlers[request_id] = handler
+        else:
+            self.data_handlers[request_id] = handler
+
+        if self._pending_writes is not None:
+            # We're in a burst of requests, they all get written together when it's over
+            self._pending_writes.extend(self.convert_message(message_data))
+        elif not self.transport.is_closing():
+            # Hand the transport the header and body as is instead of copying them into one bytes first
+            self.transport.writelines(self.convert_message(message_data))
 
-        if not self.transport.is_closing():
-            message = self.convert_message(message_data)
+    def send_batch(self, *senders):
+        """
+        Calls each of the given methods, which send a request, and writes all of their requests to the transport at
+        once so they can go out together instead of one write each
+        """
+        self._pending_writes = []
+        try:
+            for sender in senders:
+                sender()
+        finally:
+            pending_writes = self._pending_writes
+            self._pending_writes = None
 
-            self.transport.write(message)
+        if pending_writes and not self.transport.is_closing():
+            self.transport.writelines(pending_writes)
 
     @staticmethod
     def convert_message(data):
-        message_data = json.dumps(data, indent=4)
+        """ Returns the DHIP header and the body for the given message """
+        # The frame is length prefixed so the device doesn't need any whitespace, compact is smaller and faster to encode
+        message_data = json_dumps_bytes(data)
+        message_length = len(message_data)
 
-        header = struct.pack(">L", 0x20000000)
-        header += struct.pack(">L", 0x44484950)
-        header += struct.pack(">d", 0)
-        header += struct.pack("<L", len(message_data))
-        header += struct.pack("<L", 0)
-        header += struct.pack("<L", len(message_data))
-        header += struct.pack("<L", 0)
+        header = DHIP_HEADER_START.pack(0x20000000, 0x44484950, 0)
+        header += DHIP_HEADER_LENGTHS.pack(message_length, 0, message_length, 0)
 
-        message = header + message_data.encode("utf-8")
-
-        return message
+        return header, message_data
 
     def pre_login(self):
         _LOGGER.debug("Prepare pre-login message")
@@ -203,13 +261,7 @@ class DahuaVTOClient(asyncio.Protocol):
 
                     self.login()
 
-        request_data = {
-            "clientType": "",
-            "ipAddr": "(null)",
-            "loginType": "Direct",
-            "userName": self.username,
-            "password": ""
-        }
+        request_data = {**PRE_LOGIN_PARAMS, "userName": self.username}
 
         self.send(DAHUA_GLOBAL_LOGIN, handle_pre_login, request_data)
 
@@ -225,24 +277,19 @@ class DahuaVTOClient(asyncio.Protocol):
             if keep_alive_interval is not None:
                 self.keep_alive_interval = keep_alive_interval - 5
 
-                self.load_access_control()
-                self.load_version()
-                self.load_serial_number()
-                self.load_device_type()
-                self.attach_event_manager()
+                self.send_batch(
+                    self.load_access_control,
+                    self.load_version,
+                    self.load_serial_number,
+                    self.load_device_type,
+                    self.attach_event_manager
+                )
 
-                Timer(self.keep_alive_interval, self.keep_alive).start()
+                self._keep_alive_handle = self._loop.call_later(self.keep_alive_interval, self.keep_alive)
 
         password = self._get_hashed_password(self.random, self.realm, self.username, self.password)
 
-        request_data = {
-            "clientType": "",
-            "ipAddr": "(null)",
-            "loginType": "Direct",
-            "userName": self.username,
-            "password": password,
-            "authorityType": "Default"
-        }
+        request_data = {**LOGIN_PARAMS, "userName": self.username, "password": password}
 
         self.send(DAHUA_GLOBAL_LOGIN, handle_login, request_data)
 
@@ -258,11 +305,7 @@ class DahuaVTOClient(asyncio.Protocol):
             if method == "client.notifyEventStream":
                 self.handle_notify_event_stream(params)
 
-        request_data = {
-            "codes": ['All']
-        }
-
-        self.send(DAHUA_EVENT_MANAGER_ATTACH, handle_attach_event_manager, request_data)
+        self.send(DAHUA_EVENT_MANAGER_ATTACH, handle_attach_event_manager, ATTACH_EVENT_MANAGER_PARAMS, stream=True)
 
     def load_access_control(self):
         _LOGGER.info("Get access control configuration")
@@ -283,11 +326,7 @@ class DahuaVTOClient(asyncio.Protocol):
 
                         _LOGGER.info(f"Hold time: {self.hold_time}")
 
-        request_data = {
-            "name": "AccessControl"
-        }
-
-        self.send(DAHUA_CONFIG_MANAGER_GETCONFIG, handle_access_control, request_data)
+        self.send(DAHUA_CONFIG_MANAGER_GETCONFIG, handle_access_control, ACCESS_CONTROL_CONFIG_PARAMS)
 
     async def cancel_call(self):
         _LOGGER.info("Cancelling call on VTO")
@@ -310,8 +349,8 @@ class DahuaVTOClient(asyncio.Protocol):
             build_date = version_details.get("BuildDate")
             version = version_details.get("Version")
 
-            self.dahua_details[DAHUA_VERSION] = version
-            self.dahua_details[DAHUA_BUILD_DATE] = build_date
+            self._set_detail(DAHUA_VERSION, version)
+            self._set_detail(DAHUA_BUILD_DATE, build_date)
 
             _LOGGER.info(f"Version: {version}, Build Date: {build_date}")
 
@@ -327,7 +366,7 @@ class DahuaVTOClient(asyncio.Protocol):
             params = message.get("params")
             device_type = params.get("type")
 
-            self.dahua_details[DAHUA_DEVICE_TYPE] = device_type
+            self._set_detail(DAHUA_DEVICE_TYPE, device_type)
 
             _LOGGER.info(f"Device Type: {device_type}")
 
@@ -344,58 +383,78 @@ class DahuaVTOClient(asyncio.Protocol):
             table = params.get("table", {})
             serial_number = table.get("UUID")
 
-            self.dahua_details[DAHUA_SERIAL_NUMBER] = serial_number
+            self._set_detail(DAHUA_SERIAL_NUMBER, serial_number)
 
             _LOGGER.info(f"Serial Number: {serial_number}")
 
-        request_data = {
-            "name": "T2UServer"
-        }
-
-        self.send(DAHUA_CONFIG_MANAGER_GETCONFIG, handle_serial_number, request_data)
+        self.send(DAHUA_CONFIG_MANAGER_GETCONFIG, handle_serial_number, SERIAL_NUMBER_CONFIG_PARAMS)
 
     def keep_alive(self):
         _LOGGER.debug("Keep alive")
 
-        def handle_keep_alive(message):
-            Timer(self.keep_alive_interval, self.keep_alive).start()
-            if message is None:
-                return
+        if self._keep_alive_params is None:
+            # This runs for as long as we're connected and only the message id changes, so build the params once
+            self._keep_alive_params = {
+                "timeout": self.keep_alive_interval,
+                "action": True
+            }
 
-            message_id = message.get('id')
-            if message_id is not None and message_id in self.data_handlers:
-                del self.data_handlers[message_id]
-            else:
-                _LOGGER.warning(f'Could not delete keep alive handler with message ID {message_id}.')
+        self.send(DAHUA_GLOBAL_KEEPALIVE, self._handle_keep_alive, self._keep_alive_params)
 
-        request_data = {
-            "timeout": self.keep_alive_interval,
-            "action": True
-        }
+    def _handle_keep_alive(self, message):
+        if not self.closed.done():
+            self._keep_alive_handle = self._loop.call_later(self.keep_alive_interval, self.keep_alive)
+
+    def _pop_frames(self):
+        """
+        Yields the JSON body of each complete DHIP frame in the buffer, removing it from the buffer as it goes. Each
+        frame is a 32 byte header followed by the body, and the header tells us how long the body is, so we don't need
+        to guess where the JSON ends. Frames can look like the following (shortened with ...), and sometimes more than
+        one arrives in a read, or one is split across reads:
+        \x20\x00\x00\x00DHIP*Q\xa8f\x08\x00\x00\x00m\x04\x00\x00\x00\x00\x00\x00m\x04\x00\x00\x00\x00\x00\x00{"id":8,"method":"client.notifyEventStream","params":{"SID":513,"eventList":[{"Action":"Start","Code":"CrossRegionDetection"...},"session":1722306858}\n
+        """
+        buffer = self.buffer
+        while True:
+            # Skip anything in front of the next header, like a trailing newline from the last frame
+            magic = buffer.find(DHIP_MAGIC, 4)
+            if magic == -1:
+                # Keep the tail in case the next header was cut off part way through
+                del buffer[:-(len(DHIP_MAGIC) + 3)]
+                return
+            del buffer[:magic - 4]
 
-        self.send(DAHUA_GLOBAL_KEEPALIVE, handle_keep_alive, request_data)
+            if len(buffer) < DHIP_HEADER_SIZE:
+                return
+            body_length = DHIP_BODY_LENGTH.unpack_from(buffer, 16)[0]
+            if body_length > MAX_DHIP_BODY_BYTES:
+                _LOGGER.warning("Skipping DHIP frame with a body length of %s", body_length)
+                del buffer[:8]
+                continue
+
+            end = DHIP_HEADER_SIZE + body_length
+            if len(buffer) < end:
+                return
+            # Slicing already copies, and both json_loads flavors take a bytearray, so don't copy it again into bytes
+            body = buffer[DHIP_HEADER_SIZE:end]
+            del buffer[:end]
+            yield body
 
     @staticmethod
     def parse_response(response):
-        result = []
-
+        """ Parses the JSON body of a DHIP frame. Returns a list of the messages found in it """
         try:
-            # Messages can look like like the following, note, this was shorted with ...
-            # Note that there can 0 or more events per line. Typically it's 1 event, but sometimes 2 events will arrive.
-            # This example shows 2 events
-            # \x00\x00\x00DHIP*Q\xa8f\x08\x00\x00\x00m\x04\x00\x00\x00\x00\x00\x00m\x04\x00\x00\x00\x00\x00\x00{"id":8,"method":"client.notifyEventStream","params":{"SID":513,"eventList":[{"Action":"Start","Code":"CrossRegionDetection"...},"session":1722306858}\n \x00\x00\x00DHIP*Q\xa8f\x08\x00\x00\x00\xe8\x00\x00\x00\x00\x00\x00\x00\xe8\x00\x00\x00\x00\x00\x00\x00{"id":8,"method":"client.notifyEventStream","params":{"SID":513,"eventList":[{"Action":"Pulse","Code":"IntelliFrame",..."session":1722306858}\n'
-            # Another example
-            # \x00\x00\x00DHIP\x8c-\x96{\x08\x00\x00\x00{\x01\x00\x00\x00\x00\x00\x00{\x01\x00\x00\x00\x00\x00\x00{"id":8,"method":"client.notifyEventStream","params":{"SID":513,"eventList":[{"Action":"State","Code":"VideoMotionInfo","Data":[{"Id":0,"Region":[4194303,4194303,4128767,3997695,3801087,3801087,3932159,3407871,3932159,3932158,3932156,3735548,3678204,2101244,2047,2097663,3146239,524799],"RegionName":"Region1","State":"Active","Threshold":54}],"Index":0}]},"session":1722306858}\n
-
-            data = str(response)
+            return [json_loads(response)]
+        except ValueError:
+            pass
 
-            jsons = DahuaVTOClient.extract_json_objects(data)
-            for j in jsons:
+        # Shouldn't happen, but if the body isn't a single JSON object fall back to picking the objects out of it
+        result = []
+        try:
+            text = response.decode("utf-8", errors="replace")
+            for j in DahuaVTOClient.extract_json_objects(text):
                 result.append(j)
-            return result
-        except Exception as e:
-            exc_type, exc_obj, exc_tb = sys.exc_info()
-            _LOGGER.error(f"Failed to read data: {response}, error: {e}, Line: {exc_tb.tb_lineno}")
+        except Exception:
+            _LOGGER.exception("Failed to read data: %s", response)
 
         return result
 
@@ -419,14 +478,18 @@ class DahuaVTOClient(asyncio.Protocol):
             except ValueError:
                 pos = match + 1
 
-    @staticmethod
-    def _get_hashed_password(random, realm, username, password):
-        password_str = f"{username}:{realm}:{password}"
-        password_bytes = password_str.encode('utf-8')
-        password_hash = hashlib.md5(password_bytes).hexdigest().upper()
+    def _get_hashed_password(self, random, realm, username, password):
+        # The password hash only depends on the username, realm, and password so we only need to hash it once per realm.
+        # MD5 is what the device wants here, it's not protecting anything on our side so mark it as such
+        password_hash = self._password_hash_by_realm.get(realm)
+        if password_hash is None:
+            password_str = f"{username}:{realm}:{password}"
+            password_bytes = password_str.encode('utf-8')
+            password_hash = hashlib.md5(password_bytes, usedforsecurity=False).hexdigest().upper()
+            self._password_hash_by_realm[realm] = password_hash
 
         random_str = f"{username}:{random}:{password_hash}"
         random_bytes = random_str.encode('utf-8')
-        random_hash = hashlib.md5(random_bytes).hexdigest().upper()
+        random_hash = hashlib.md5(random_bytes, usedforsecurity=False).hexdigest().upper()
 
         return random_hash
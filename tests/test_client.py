@@ -0,0 +1,105 @@
+"""Tests for the event stream buffering in the dahua client."""
+from custom_components.dahua.client import MAX_EVENT_BUFFER_BYTES, _take_complete_events
+from custom_components.dahua.dahua_utils import parse_event
+
+EVENT_START = "Code=VideoMotion;action=Start;index=0;data={\r\n   \"Id\" : [ 0 ],\r\n   \"RegionName\" : [ \"Region1\" ]\r\n}"
+EVENT_STOP = "Code=VideoMotion;action=Stop;index=0"
+HEARTBEAT = "Heartbeat"
+
+
+def _block(body: str, content_length=True) -> bytes:
+    """One event like the camera sends it"""
+    headers = ["--myboundary", "Content-Type: text/plain"]
+    if content_length:
+        headers.append("Content-Length:{0}".format(len(body)))
+    return ("\r\n".join(headers) + "\r\n\r\n" + body + "\r\n").encode()
+
+
+def _feed(chunks) -> list:
+    """Feeds the reads through the buffer like stream_events does and returns what would be handed to on_receive"""
+    buffer = bytearray()
+    handed_off = []
+    for chunk in chunks:
+        buffer += chunk
+        events = _take_complete_events(buffer)
+        if events is not None and b"Code=" in events:
+            handed_off.append(events)
+    return handed_off
+
+
+def _parse(handed_off) -> list:
+    events = []
+    for data in handed_off:
+        events.extend(parse_event(data.decode("utf-8", errors="ignore")))
+    return events
+
+
+def test_boundary_split_across_reads():
+    """Splitting the stream at any point still gives back every event exactly once"""
+    stream = _block(EVENT_START) + _block(HEARTBEAT) + _block(EVENT_STOP)
+    expected = parse_event(stream.decode())
+    assert len(expected) == 2
+
+    for split in range(1, len(stream)):
+        handed_off = _feed([stream[:split], stream[split:]])
+        assert _parse(handed_off) == expected, split
+
+    # And one byte at a time
+    assert _parse(_feed([stream[i:i + 1] for i in range(len(stream))])) == expected
+
+
+def test_waits_for_content_length():
+    """An event isn't handed off until its Content-Length worth of body has arrived"""
+    block = _block(EVENT_START)
+    body_start = block.index(b"Code=")
+    buffer = bytearray(block[:body_start + 10])
+
+    assert _take_complete_events(buffer) is None
+
+    buffer += block[body_start + 10:]
+    events = _take_complete_events(buffer)
+    assert events == block
+    assert buffer == bytearray()
+    assert _parse([events])[0]["data"] == {"Id": [0], "RegionName": ["Region1"]}
+
+
+def test_without_content_length():
+    """Without a Content-Length whatever has arrived is treated as complete"""
+    stream = _block(EVENT_START, content_length=False) + _block(EVENT_STOP, content_length=False)
+
+    handed_off = _feed([stream])
+
+    assert handed_off == [stream]
+    assert [e["action"] for e in _parse(handed_off)] == ["Start", "Stop"]
+
+
+def test_heartbeat_only():
+    """Heartbeats are taken out of the buffer but there's nothing in them for on_receive"""
+    buffer = bytearray(_block(HEARTBEAT) + _block(HEARTBEAT))
+
+    events = _take_complete_events(buffer)
+
+    assert events is not None
+    assert b"Code=" not in events
+    assert buffer == bytearray()
+    assert parse_event(events.decode()) == []
+    assert _feed([_block(HEARTBEAT)] * 3) == []
+
+
+def test_buffer_overflow():
+    """If an event never completes the buffer is handed off once it gets too big instead of growing forever"""
+    header = b"--myboundary\r\nContent-Type: text/plain\r\nContent-Length:" + \
+        str(MAX_EVENT_BUFFER_BYTES * 2).encode() + b"\r\n\r\nCode=VideoMotion;action=Start;index=0;data="
+    buffer = bytearray(header)
+    assert _take_complete_events(buffer) is None
+
+    buffer += b"x" * (MAX_EVENT_BUFFER_BYTES - len(header) - 1)
+    assert _take_complete_events(buffer) is None
+
+    buffer += b"x"
+    events = _take_complete_events(buffer)
+    assert len(events) == MAX_EVENT_BUFFER_BYTES
+    assert buffer == bytearray()
+
+    # The stream carries on normally after that
+    assert _parse(_feed([_block(EVENT_STOP)])) == [{"Code": "VideoMotion", "action": "Stop", "index": "0"}]
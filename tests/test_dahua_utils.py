@@ -0,0 +1,96 @@
+"""Tests for dahua_utils."""
+from custom_components.dahua.dahua_utils import parse_event
+
+
+def _stream(*bodies, newline="\n"):
+    """Builds event stream data like the camera sends, one boundary and set of headers per body"""
+    blocks = []
+    for body in bodies:
+        blocks.append(newline.join([
+            "--myboundary",
+            "Content-Type: text/plain",
+            "Content-Length:{0}".format(len(body)),
+            "",
+            body,
+            "",
+        ]))
+    return "".join(blocks)
+
+
+def test_parse_event_lf():
+    """A single event with \\n line endings"""
+    events = parse_event(_stream("Code=VideoMotion;action=Start;index=0"))
+
+    assert events == [{"Code": "VideoMotion", "action": "Start", "index": "0"}]
+
+
+def test_parse_event_crlf():
+    """A single event with \\r\\n line endings"""
+    events = parse_event(_stream("Code=VideoMotion;action=Start;index=0", newline="\r\n"))
+
+    assert events == [{"Code": "VideoMotion", "action": "Start", "index": "0"}]
+
+
+def test_parse_event_multiple_events_lf():
+    """Several events can arrive in one read and each one should come back on its own"""
+    events = parse_event(_stream(
+        "Code=VideoMotion;action=Start;index=0;data={\n   \"Id\" : [ 0 ]\n}",
+        "Code=VideoMotion;action=Stop;index=0",
+    ))
+
+    assert events == [
+        {"Code": "VideoMotion", "action": "Start", "index": "0", "data": {"Id": [0]}},
+        {"Code": "VideoMotion", "action": "Stop", "index": "0"},
+    ]
+
+
+def test_parse_event_multiple_events_crlf():
+    """The data of the first event must not swallow the events after it"""
+    events = parse_event(_stream(
+        "Code=VideoMotion;action=Start;index=0;data={\r\n   \"Id\" : [ 0 ]\r\n}",
+        "Code=VideoMotion;action=Stop;index=1",
+        "Code=CrossLineDetection;action=Start;index=0",
+        newline="\r\n",
+    ))
+
+    assert events == [
+        {"Code": "VideoMotion", "action": "Start", "index": "0", "data": {"Id": [0]}},
+        {"Code": "VideoMotion", "action": "Stop", "index": "1"},
+        {"Code": "CrossLineDetection", "action": "Start", "index": "0"},
+    ]
+
+
+def test_parse_event_data_with_separators():
+    """data is always last and its json can contain ; and = which must not be split on"""
+    body = 'Code=NewFile;action=Pulse;index=0;data={ "File" : "/a;b=c.jpg", "Size" : 10 }'
+    for newline in ("\n", "\r\n"):
+        events = parse_event(_stream(body, body, newline=newline))
+
+        assert events == [
+            {"Code": "NewFile", "action": "Pulse", "index": "0", "data": {"File": "/a;b=c.jpg", "Size": 10}},
+        ] * 2
+
+
+def test_parse_event_plain_data():
+    """Some events send a plain value for data, which is kept as a string"""
+    events = parse_event(_stream("Code=TimeChange;action=Pulse;index=0;data=12", newline="\r\n"))
+
+    assert events == [{"Code": "TimeChange", "action": "Pulse", "index": "0", "data": "12"}]
+
+
+def test_parse_event_channel():
+    """Events for other channels are skipped"""
+    data = _stream(
+        "Code=VideoMotion;action=Start;index=0",
+        "Code=VideoMotion;action=Start;index=1",
+        "Code=VideoMotion;action=Start",
+        newline="\r\n",
+    )
+
+    assert [e.get("index") for e in parse_event(data, 0)] == ["0", None]
+    assert [e.get("index") for e in parse_event(data, 1)] == ["1"]
+
+
+def test_parse_event_heartbeat():
+    """The heartbeat isn't an event"""
+    assert parse_event(_stream("Heartbeat", newline="\r\n")) == []
@@ -0,0 +1,59 @@
+"""Tests for the DHIP framing in the VTO client."""
+import struct
+
+from custom_components.dahua.vto import MAX_DHIP_BODY_BYTES, DahuaVTOClient
+
+
+def _frame(message: dict) -> bytes:
+    header, body = DahuaVTOClient.convert_message(message)
+    # The device sends a newline after the body
+    return header + body + b"\n"
+
+
+def _client() -> DahuaVTOClient:
+    # Framing only needs the buffer, so skip the connection setup in __init__
+    client = DahuaVTOClient.__new__(DahuaVTOClient)
+    client.buffer = bytearray()
+    return client
+
+
+def _feed(client, chunks) -> list:
+    """Feeds the reads through the buffer like data_received does and returns the parsed messages"""
+    messages = []
+    for chunk in chunks:
+        client.buffer += chunk
+        for body in client._pop_frames():
+            messages.extend(DahuaVTOClient.parse_response(body))
+    return messages
+
+
+FIRST = {"id": 8, "method": "client.notifyEventStream",
+         "params": {"SID": 513, "eventList": [{"Action": "Start", "Code": "VideoMotion", "Note": "a\nb {"}]}}
+SECOND = {"id": 9, "params": {"type": "VTO2211G"}, "result": True}
+
+
+def test_frames_split_at_every_offset():
+    """Two frames split anywhere come back whole, once each, and only the trailing newline is left in the buffer"""
+    stream = _frame(FIRST) + _frame(SECOND)
+
+    for split in range(len(stream) + 1):
+        client = _client()
+        assert _feed(client, [stream[:split], stream[split:]]) == [FIRST, SECOND], split
+        assert client.buffer == bytearray(b"\n")
+
+
+def test_frames_one_byte_at_a_time():
+    client = _client()
+    stream = b"junk" + _frame(FIRST) + _frame(SECOND)
+
+    assert _feed(client, [stream[i:i + 1] for i in range(len(stream))]) == [FIRST, SECOND]
+
+
+def test_bad_body_length_is_skipped():
+    """A header claiming a huge body is skipped instead of waiting on it, and the next frame still comes through"""
+    bad = bytearray(_frame(FIRST))
+    struct.pack_into("<L", bad, 16, MAX_DHIP_BODY_BYTES + 1)
+    client = _client()
+
+    assert _feed(client, [bytes(bad) + _frame(SECOND)]) == [SECOND]
+    assert client.buffer == bytearray(b"\n")